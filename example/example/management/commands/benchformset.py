@@ -0,0 +1,51 @@
+import timeit
+from django.core.management.base import BaseCommand
+from django.contrib.contenttypes.models import ContentType
+from searchkit.forms import searchkit_formset_factory
+from example.models import ModelA
+
+
+class Command(BaseCommand):
+    help = 'Measure the validation of bound searchkit formsets by their number of rules'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-r', '--rules',
+            type=int,
+            nargs='+',
+            default=[10, 40, 160],
+            help='Numbers of rules to measure.',
+        )
+        parser.add_argument(
+            '-n', '--number',
+            type=int,
+            default=20,
+            help='Number of validations per measurement.',
+        )
+
+    def get_data(self, formset_class, count):
+        prefix = formset_class.get_default_prefix()
+        data = {
+            'searchkit_model': str(ContentType.objects.get_for_model(ModelA).pk),
+            f'{prefix}-TOTAL_FORMS': str(count),
+            f'{prefix}-INITIAL_FORMS': str(count),
+        }
+        for i in range(count):
+            data.update({
+                f'{prefix}-{i}-field': 'integer',
+                f'{prefix}-{i}-operator': 'exact',
+                f'{prefix}-{i}-value': str(i),
+            })
+        return data
+
+    def handle(self, *args, **options):
+        formset_class = searchkit_formset_factory(model=ModelA)
+        # Build the field catalog before measuring.
+        formset_class(self.get_data(formset_class, 1)).is_valid()
+
+        self.stdout.write(f'{"Rules":>6}  {"ms":>8}')
+        for count in options['rules']:
+            data = self.get_data(formset_class, count)
+            timer = timeit.Timer(lambda: formset_class(data).is_valid())
+            seconds = min(timer.repeat(repeat=3, number=options['number'])) / options['number']
+            self.stdout.write(f'{count:>6}  {seconds * 1000:>8.2f}')
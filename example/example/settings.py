@@ -123,3 +123,8 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# The development server runs a single process. So a local-memory cache will
+# do for searchkit.
+SEARCHKIT_CACHE = 'default'
+SILENCED_SYSTEM_CHECKS = ['searchkit.W002']
@@ -1,6 +1,11 @@
+import re
 from django.utils.http import urlsafe_base64_encode
 from django.contrib import admin
+from django.contrib.auth import get_permission_codename
+from django.core.exceptions import PermissionDenied
+from django.db import DatabaseError
 from django.http import HttpResponseRedirect
+from django.template.response import TemplateResponse
 from django.urls import reverse
 from django.utils.html import format_html
 from .models import Search
@@ -9,6 +14,17 @@ from .filters import SearchkitFilter
 from .filters import SearchableModelFilter
 
 
+# Estimated cost and rows of a postgresql plan.
+PLAN_ESTIMATES_PATTERN = re.compile(r'cost=[\d.]+\.\.(?P<cost>[\d.]+) rows=(?P<rows>\d+)')
+
+# Full table scans of postgresql and sqlite plans.
+FULL_SCAN_PATTERNS = (
+    re.compile(r'Seq Scan on (\w+)'),
+    # Sqlite before 3.36 writes SCAN TABLE.
+    re.compile(r'\bSCAN (?:TABLE )?(\w+)'),
+)
+
+
 @admin.register(Search)
 class SearchkitSearchAdmin(admin.ModelAdmin):
     form = SearchForm
@@ -19,10 +35,27 @@ class SearchkitSearchAdmin(admin.ModelAdmin):
         """
         Given a model instance save it to the database.
         """
-        # We do not want to save the object when just applying the search.
-        if not '_apply' in request.POST:
+        # We do not want to save the object when just applying or explaining
+        # the search.
+        if not any(k in request.POST for k in ('_apply', '_explain', '_explain_analyze')):
             obj.save()
 
+    def is_explain_request(self, request):
+        return '_explain' in request.POST or '_explain_analyze' in request.POST
+
+    def log_addition(self, request, obj, message):
+        # Explained searches are not saved. So there is nothing to log.
+        if not self.is_explain_request(request):
+            return super().log_addition(request, obj, message)
+
+    def log_change(self, request, obj, message):
+        if not self.is_explain_request(request):
+            return super().log_change(request, obj, message)
+
+    def render_change_form(self, request, context, *args, **kwargs):
+        context['can_analyze_search'] = request.user.has_perm('searchkit.analyze_search')
+        return super().render_change_form(request, context, *args, **kwargs)
+
     def get_apply_search_url(self, obj, data=None):
         app_label = obj.contenttype.app_label
         model_name = obj.contenttype.model
@@ -39,6 +72,8 @@ class SearchkitSearchAdmin(admin.ModelAdmin):
             return HttpResponseRedirect(self.get_apply_search_url(obj))
         elif '_apply' in request.POST:
             return HttpResponseRedirect(self.get_apply_search_url(obj, request.POST))
+        elif self.is_explain_request(request):
+            return self.explain_search(request, obj)
         else:
             return super().response_add(request, obj, *args, **kwargs)
 
@@ -47,9 +82,59 @@ class SearchkitSearchAdmin(admin.ModelAdmin):
             return HttpResponseRedirect(self.get_apply_search_url(obj))
         elif '_apply' in request.POST:
             return HttpResponseRedirect(self.get_apply_search_url(obj, data=request.POST))
+        elif self.is_explain_request(request):
+            return self.explain_search(request, obj)
         else:
             return super().response_change(request, obj, *args, **kwargs)
 
+    def explain_search(self, request, obj):
+        """
+        Render the query plan of the changelist the search would be applied to.
+        Analyzing the query runs it. So this is restricted to users with the
+        analyze_search permission.
+        """
+        analyze = '_explain_analyze' in request.POST
+        if analyze and not request.user.has_perm('searchkit.analyze_search'):
+            raise PermissionDenied
+
+        model = obj.contenttype.model_class()
+        model_admin = self.admin_site._registry.get(model)
+        # The plan tells about the data of the model. So users need to be
+        # allowed to view it.
+        if model_admin:
+            allowed = model_admin.has_view_permission(request)
+        else:
+            opts = model._meta
+            allowed = request.user.has_perm(f'{opts.app_label}.{get_permission_codename("view", opts)}')
+        if not allowed:
+            raise PermissionDenied
+
+        queryset = model_admin.get_queryset(request) if model_admin else model._default_manager.all()
+        queryset = queryset.filter(obj.as_q())
+
+        context = dict(
+            self.admin_site.each_context(request),
+            title=f'Explain search "{obj.name}"',
+            opts=self.model._meta,
+            search=obj,
+            model=model,
+            analyze=analyze,
+        )
+        try:
+            plan = queryset.explain(analyze=True) if analyze else queryset.explain()
+        except (ValueError, DatabaseError) as error:
+            # Backends not supporting the analyze option raise a ValueError.
+            context['error'] = error
+        else:
+            first_line = plan.splitlines()[0] if plan else ''
+            estimates = PLAN_ESTIMATES_PATTERN.search(first_line)
+            context.update(
+                plan=plan,
+                estimates=estimates.groupdict() if estimates else None,
+                full_scans=sorted({t for p in FULL_SCAN_PATTERNS for t in p.findall(plan)}),
+            )
+        return TemplateResponse(request, 'admin/searchkit/search/explain.html', context)
+
     def apply_search_view(self, obj):
         """
         Returns a link to apply the search.
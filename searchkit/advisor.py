@@ -0,0 +1,189 @@
+from collections import Counter
+from django.db import models
+from django.db import router
+from django.db import connections
+from django.db.migrations import AddIndex
+from django.db.migrations.executor import MigrationExecutor
+from django.db.migrations.writer import OperationWriter
+from django.contrib.contenttypes.models import ContentType
+from .models import Search
+from .utils import SearchSchema
+from .utils import get_field_catalog
+from .utils import get_searchable_models
+from .optimizer import rewrite_rule
+
+
+# Operators a btree index could be used for.
+INDEX_OPERATORS = ('exact', 'in', 'gt', 'gte', 'lt', 'lte', 'range', 'startswith', 'isnull')
+
+# Operators matching patterns. Postgresql only uses an index for them if its
+# operator class compares the values character by character.
+PATTERN_OPERATORS = ('startswith',)
+PATTERN_OPCLASSES = {
+    'CharField': 'varchar_pattern_ops',
+    'TextField': 'text_pattern_ops',
+}
+
+
+class MissingIndex:
+    """
+    A model field searched by field lookups of searchable models which has no
+    index in the database. An index might be declared by the model but not yet
+    be migrated.
+    """
+    def __init__(self, model, field, declared):
+        self.model = model
+        self.field = field
+        self.declared = declared
+        self.field_lookups = []
+        self.uses = 0
+        self.pattern_uses = 0
+
+    def __str__(self):
+        return f'{self.model._meta.label}.{self.field.name}'
+
+    @property
+    def status(self):
+        return 'not migrated' if self.declared else 'missing'
+
+    def get_pattern_opclass(self):
+        """
+        Return the operator class an index needs to be used by the pattern
+        lookups of the field or None if a plain index will do.
+        """
+        if not self.pattern_uses:
+            return None
+        if connections[router.db_for_write(self.model)].vendor != 'postgresql':
+            return None
+        return PATTERN_OPCLASSES.get(self.field.get_internal_type())
+
+    def get_index(self, suffix='idx', **kwargs):
+        # Indexes with operator classes need a name from the start.
+        index = models.Index(fields=[self.field.name], name=suffix, **kwargs)
+        index.suffix = suffix
+        index.set_name_with_model(self.model)
+        return index
+
+    def get_operations(self):
+        """
+        Return the AddIndex operations for the lookups the field is used by.
+        """
+        opclass = self.get_pattern_opclass()
+        indexes = []
+        if not opclass or self.uses > self.pattern_uses:
+            indexes.append(self.get_index())
+        if opclass:
+            indexes.append(self.get_index('pat', opclasses=[opclass]))
+        return [AddIndex(model_name=self.model._meta.model_name, index=index) for index in indexes]
+
+
+def are_migrations_applied(using):
+    """
+    Check if all migrations of searchkit are applied to the database. Saved
+    searches could not be read before.
+    """
+    executor = MigrationExecutor(connections[using])
+    return not executor.migration_plan(executor.loader.graph.leaf_nodes('searchkit'))
+
+
+def get_field_lookup_uses():
+    """
+    Count the rules of saved searches by model, field lookup and whether they
+    match patterns. Only rules which could use an index of their field are
+    counted.
+    """
+    uses = Counter()
+    for contenttype_id, data in Search.objects.values_list('contenttype_id', 'data'):
+        model = ContentType.objects.get_for_id(contenttype_id).model_class()
+        if model is None:
+            continue
+        field_hints = SearchSchema(model).field_hints
+        for rule in data:
+            lookups = rewrite_rule(rule, field_hints.get(rule['field'], {}))
+            operators = {lookup.rsplit('__', 1)[-1] for lookup in lookups}
+            if operators & set(INDEX_OPERATORS):
+                uses[(model, rule['field'], bool(operators & set(PATTERN_OPERATORS)))] += 1
+    return uses
+
+
+def get_declared_index_columns(model):
+    """
+    Return the columns of a model's table leading one of its declared indexes.
+    """
+    opts = model._meta
+    columns = {f.column for f in opts.local_concrete_fields if f.primary_key or f.unique or f.db_index}
+    for index in opts.indexes:
+        # Partial indexes only help some queries.
+        if index.fields and index.condition is None:
+            columns.add(opts.get_field(index.fields[0].lstrip('-')).column)
+    for fields in opts.unique_together:
+        columns.add(opts.get_field(fields[0]).column)
+    for constraint in opts.constraints:
+        if isinstance(constraint, models.UniqueConstraint) and constraint.fields and constraint.condition is None:
+            columns.add(opts.get_field(constraint.fields[0]).column)
+    return columns
+
+
+def get_database_index_columns(model):
+    """
+    Return the columns of a model's table leading one of the indexes found in
+    the database.
+    """
+    connection = connections[router.db_for_read(model)]
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+    return {
+        c['columns'][0] for c in constraints.values()
+        if c['columns'] and (c['index'] or c['unique'] or c['primary_key'])
+    }
+
+
+def get_missing_indexes(include_unused=False, databases=None):
+    """
+    Return the model fields searched by the field lookups of searchable models
+    which lack an index, ranked by their uses in saved searches. Fields not
+    used by any saved search are only included if include_unused is True.
+    """
+    uses = get_field_lookup_uses()
+    missing_indexes = dict()
+    index_columns = dict()
+    for model in get_searchable_models():
+        for field_lookup, field in get_field_catalog(model).get_model_fields().items():
+            # Only fields with a column of their own could be indexed.
+            if not field.concrete or field.many_to_many:
+                continue
+            target = field.model
+            if databases is not None and router.db_for_read(target) not in databases:
+                continue
+            if target not in index_columns:
+                index_columns[target] = (get_declared_index_columns(target), get_database_index_columns(target))
+            declared, existing = index_columns[target]
+            if field.column in existing:
+                continue
+
+            key = (target, field.name)
+            if key not in missing_indexes:
+                missing_indexes[key] = MissingIndex(target, field, field.column in declared)
+            missing_index = missing_indexes[key]
+            missing_index.field_lookups.append(f'{model._meta.label_lower}:{field_lookup}')
+            missing_index.uses += uses[(model, field_lookup, False)] + uses[(model, field_lookup, True)]
+            missing_index.pattern_uses += uses[(model, field_lookup, True)]
+
+    missing_indexes = [m for m in missing_indexes.values() if m.uses or include_unused]
+    return sorted(missing_indexes, key=lambda m: (-m.uses, str(m)))
+
+
+def serialize_operations(missing_indexes):
+    """
+    Return the AddIndex operations of the missing indexes by app label as
+    they would be written to a migration file.
+    """
+    operations = dict()
+    for missing_index in missing_indexes:
+        # Declared indexes only need to be migrated.
+        if missing_index.declared:
+            continue
+        for operation in missing_index.get_operations():
+            operation, _ = OperationWriter(operation, indentation=0).serialize()
+            operations.setdefault(missing_index.model._meta.app_label, []).append(operation)
+    return operations
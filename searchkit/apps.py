@@ -4,3 +4,15 @@ from django.apps import AppConfig
 class SearchkitConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'searchkit'
+
+    def ready(self):
+        # Load the prebuilt field catalogs once at startup. So workers do not
+        # have to build them on their first search request.
+        from .utils import load_field_catalog_file
+        load_field_catalog_file()
+
+        # Connect the signal receivers invalidating our caches.
+        from . import cache  # noqa: F401
+
+        # Register the system checks.
+        from . import checks  # noqa: F401
@@ -0,0 +1,89 @@
+import json
+import uuid
+import hashlib
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+
+def get_cache():
+    """
+    Return the cache configured by the SEARCHKIT_CACHE setting. Caching is
+    disabled unless it names a cache alias. The cache must be shared by all
+    processes to notice changes of the data.
+    """
+    alias = getattr(settings, 'SEARCHKIT_CACHE', None)
+    return caches[alias] if alias else None
+
+
+def get_cache_timeout():
+    return getattr(settings, 'SEARCHKIT_CACHE_TIMEOUT', 300)
+
+
+def get_cardinality_timeout():
+    return getattr(settings, 'SEARCHKIT_CARDINALITY_TIMEOUT', 3600)
+
+
+def _get_version_key(model):
+    return f'searchkit:version:{model._meta.label_lower}'
+
+
+def get_data_version(model):
+    """
+    Return a token which changes each time the data of a model changes. It is
+    part of all cache keys built for this model. So changing it invalidates
+    all entries at once. Stale entries are left to the eviction of the cache.
+    """
+    cache = get_cache()
+    key = _get_version_key(model)
+    version = cache.get(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        # Another process might have been faster.
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+def invalidate_data_version(model):
+    """
+    Invalidate all cache entries of a model. Use it after bulk operations like
+    QuerySet.update() or bulk_create() which do not send any signals.
+    """
+    if cache := get_cache():
+        # Fields of multi-table inheritance live on the parent models.
+        model = model._meta.concrete_model
+        cache.delete_many([_get_version_key(m) for m in [model, *model._meta.get_parent_list()]])
+
+
+def get_cache_key(prefix, model, *parts, versioned=True):
+    """
+    Build a cache key for the data of a model. The parts are hashed to keep
+    the key short and free of characters some backends do not accept. Keys
+    which are not versioned outlive changes of the data.
+    """
+    # Data of a child model also changes with the data of its parents.
+    if versioned:
+        versions = [get_data_version(m) for m in [model, *model._meta.get_parent_list()]]
+    else:
+        versions = []
+    digest = hashlib.sha1(json.dumps([versions, parts], default=str).encode('utf-8')).hexdigest()
+    return f'searchkit:{prefix}:{model._meta.label_lower}:{digest}'
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_on_change(sender, using=None, **kwargs):
+    # Import here to avoid circular imports.
+    from .utils import is_searched_model
+
+    # Only data of models searchkit offers fields of is cached.
+    if not is_searched_model(sender):
+        return
+    invalidate_data_version(sender)
+    # Other processes could have cached the old data again until the
+    # transaction is committed.
+    transaction.on_commit(lambda: invalidate_data_version(sender), using=using)
@@ -0,0 +1,56 @@
+from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Tags
+from django.core.checks import Warning
+from django.core.checks import register
+from django.db import router
+from .advisor import are_migrations_applied
+from .advisor import get_missing_indexes
+from .cache import get_cache
+from .models import Search
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Warn if the cache of searchkit is private to each process. Changes of the
+    data would not be noticed by other processes.
+    """
+    if not isinstance(get_cache(), LocMemCache):
+        return []
+    return [Warning(
+        f'The SEARCHKIT_CACHE "{settings.SEARCHKIT_CACHE}" is a local-memory cache private to each process.',
+        hint='Use a cache shared by all processes like memcached, redis or the database cache.',
+        id='searchkit.W002',
+    )]
+
+
+@register(Tags.database)
+def check_missing_indexes(app_configs, databases=None, **kwargs):
+    """
+    Warn about fields used by saved searches which lack a database index. The
+    SEARCHKIT_INDEX_CHECK_MIN_USES setting is the number of uses a field
+    needs to be reported. The check is disabled unless it is set.
+    """
+    min_uses = getattr(settings, 'SEARCHKIT_INDEX_CHECK_MIN_USES', None)
+    if not databases or min_uses is None:
+        return []
+
+    # The check also runs before our migrations are applied.
+    if not are_migrations_applied(router.db_for_read(Search)):
+        return []
+
+    warnings = []
+    for missing_index in get_missing_indexes(databases=databases):
+        if missing_index.uses < min_uses:
+            continue
+        if app_configs is not None and missing_index.model._meta.app_config not in app_configs:
+            continue
+        warnings.append(Warning(
+            f'{missing_index} is used by {missing_index.uses} rules of saved searches but has no index.',
+            hint='Run "manage.py searchkit_indexes --migrations" for the operations adding it.'
+                 if not missing_index.declared else 'Run "manage.py migrate" to create the declared index.',
+            obj=missing_index.model,
+            id='searchkit.W001',
+        ))
+    return warnings
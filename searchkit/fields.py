@@ -1,5 +1,6 @@
 from django import forms
 from django.urls import reverse
+from django.core.exceptions import ValidationError
 from django.utils.http import urlencode
 from django.contrib.admin import widgets
 from django.forms.models import ModelChoiceIterator
@@ -59,6 +60,38 @@ class DateTimeRangeField(BaseRangeField):
     widget_type = widgets.AdminSplitDateTime
 
 
+class FieldLookupField(forms.ChoiceField):
+    """
+    Choice field for the field lookups of a field plan. Building the choices
+    means walking the whole model tree. So we build them not until they are
+    needed and validate values by resolving the lookup itself. The widget
+    renders the selected lookup only.
+    """
+    def __init__(self, field_plan, **kwargs):
+        self.field_plan = field_plan
+        kwargs.setdefault('widget', skwidgets.FieldLookupSelect(field_plan))
+        super().__init__(choices=field_plan.get_field_lookup_choices, **kwargs)
+
+    def valid_value(self, value):
+        return self.field_plan.is_valid_field_lookup(value)
+
+
+def get_value_queryset(model_field, model=None):
+    """
+    Return the distinct values of a model field ordered by value.
+    """
+    lookup = model_field.attname
+    queryset = (model or model_field.model).objects.all()
+    queryset = queryset.values_list(lookup, flat=True)
+    # Null values are no valid choices.
+    queryset = queryset.exclude(**{f'{lookup}__isnull': True})
+    # We order by our field to neutralize former ordering which might
+    # interfere with the sql distinct statement.
+    queryset = queryset.order_by(lookup)
+    queryset = queryset.distinct()
+    return queryset
+
+
 class FieldChoiceIterator(ModelChoiceIterator):
     """
     The ModelChoiceIterator do what we need. We just build our choices based
@@ -79,19 +112,13 @@ class Select2Mixin:
         self.model_field = model_field
         self.model = model_field.model
         self.queryset = self._get_queryset()
+        self._existing_values = None
         # ModelChoiceIterator expects an empty_label attribute.
         self.empty_label = None
         super().__init__(*args, **kwargs)
 
     def _get_queryset(self):
-        lookup = self.model_field.attname
-        queryset = self.model.objects.all()
-        queryset = queryset.values_list(lookup, flat=True)
-        # We order by our field to neutralize former ordering which might
-        # interfere with the sql distinct statement.
-        queryset = queryset.order_by(lookup)
-        queryset = queryset.distinct()
-        return queryset
+        return get_value_queryset(self.model_field)
 
     def _set_queryset(self, queryset):
         self._queryset = None if queryset is None else queryset.all()
@@ -100,10 +127,10 @@ class Select2Mixin:
     queryset = property(_get_queryset, _set_queryset)
 
     def _get_choices(self):
-        # FIXME: This comes from django core. But I wonder if the choices are
-        # accessed multiple times, won't we evaluate the queryset each time a
-        # new? It does make sense to me yet.
-
+        # The choices are only evaluated if someone iterates them. Our widgets
+        # render the selected values only and values are validated by
+        # valid_value without the choices. So the queryset of all distinct
+        # values is never evaluated when a form is rendered or validated.
 
         # Otherwise, execute the QuerySet in self.queryset to determine the
         # choices dynamically. Return a fresh ModelChoiceIterator that has not been
@@ -116,6 +143,42 @@ class Select2Mixin:
 
     choices = property(_get_choices, forms.ChoiceField.choices.fset)
 
+    def _get_existing_values(self, values):
+        """
+        Return those values that exist in the database as strings.
+        """
+        # Skip values that could not be used as lookup value for our field.
+        # Those cannot exist anyway.
+        lookup_values = []
+        for value in values:
+            try:
+                lookup_values.append(self.model_field.to_python(value))
+            except ValidationError:
+                continue
+        if not lookup_values:
+            return set()
+
+        lookup = self.model_field.attname
+        queryset = self.model.objects.filter(**{f'{lookup}__in': lookup_values})
+        queryset = queryset.values_list(lookup, flat=True).order_by().distinct()
+        return {str(v) for v in queryset}
+
+    def validate(self, value):
+        # Look up all values with a single query before they are checked one
+        # by one using valid_value.
+        values = value if isinstance(value, (list, tuple)) else [value]
+        self._existing_values = self._get_existing_values([v for v in values if v])
+        try:
+            super().validate(value)
+        finally:
+            self._existing_values = None
+
+    def valid_value(self, value):
+        if self._existing_values is None:
+            return str(value) in self._get_existing_values([value])
+        else:
+            return str(value) in self._existing_values
+
     def _get_url(self):
         base_url = reverse('searchkit-autocomplete')
         url_params = {
@@ -135,7 +198,7 @@ class Select2Mixin:
         """
         attrs = super().widget_attrs(widget)
         attrs.update({
-            "class": 'admin-autocomplete',
+            "class": 'searchkit-autocomplete',
             "data-placeholder": "search...",
             "data-theme": "admin-autocomplete",
             "data-ajax--dataType": 'json',
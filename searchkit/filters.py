@@ -5,7 +5,7 @@ from django.contrib import messages
 from django.contrib.contenttypes.models import ContentType
 from .models import Search
 from .forms import SearchForm
-from .utils import is_searchable_model
+from .utils import get_searchable_contenttype_ids
 
 
 class SearchkitFilter(admin.SimpleListFilter):
@@ -63,8 +63,11 @@ class SearchkitFilter(admin.SimpleListFilter):
                     messages.error(request, "No valid search data provided.")
                     return queryset.none()
 
-            # We use distinct since we might filter over many-to-many relations.
-            return queryset.filter(search.as_q()).distinct()
+            # Rules over to-many relations are compiled into exists subqueries.
+            # So the search never duplicates rows and we do not need distinct.
+            # Other filters of the changelist spawning duplicates are taken
+            # care of by the changelist itself.
+            return queryset.filter(search.as_q())
 
         else:
             return queryset
@@ -80,7 +83,8 @@ class SearchableModelFilter(admin.filters.RelatedFieldListFilter):
     """
     Only offer searchable models as filter choices.
     """
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        contenttypes = ContentType.objects.order_by('app_label', 'model')
-        self.lookup_choices = [(m.id, m) for m in contenttypes if is_searchable_model(m.model_class())]
+    def field_choices(self, field, request, model_admin):
+        # Content types are cached by their manager. So we do not need to hit
+        # the database.
+        contenttypes = [ContentType.objects.get_for_id(i) for i in get_searchable_contenttype_ids()]
+        return [(ct.id, ct) for ct in contenttypes]
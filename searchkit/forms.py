@@ -1,5 +1,5 @@
+from collections import defaultdict
 from django import forms
-from django.apps import apps
 from django.urls import reverse
 from django.utils.translation import gettext_lazy as _
 from django.utils.functional import cached_property
@@ -7,7 +7,8 @@ from django.contrib.contenttypes.models import ContentType
 from django.contrib.admin import widgets
 from .models import Search
 from .utils import FieldPlan
-from .utils import is_searchable_model
+from .utils import get_searchable_contenttype_ids
+from .fields import FieldLookupField
 
 
 RELOAD_CSS_CLASS = "searchkit-reload"
@@ -19,8 +20,7 @@ class SearchkitModelForm(forms.Form):
     """
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        models = [m for m in apps.get_models() if is_searchable_model(m)]
-        ids = [ContentType.objects.get_for_model(m).id for m in models]
+        ids = get_searchable_contenttype_ids()
         queryset = self.fields['searchkit_model'].queryset.filter(pk__in=ids)
         self.fields['searchkit_model'].queryset = queryset
 
@@ -174,9 +174,13 @@ class BaseSearchkitForm(forms.Form):
         "data-reload-handler": "change",
     }
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, field_plan=None, unprefixed_data=None, **kwargs):
         super().__init__(*args, **kwargs)
-        self.field_plan = FieldPlan(self.model, self.initial)
+        # Forms of a formset share the field plan of the formset and get their
+        # slice of the data from it.
+        self.field_plan = field_plan or FieldPlan(self.model)
+        if unprefixed_data is not None:
+            self.unprefixed_data = unprefixed_data
         self._add_field_lookup_field()
         self._add_operator_field()
         self._add_value_field()
@@ -209,15 +213,14 @@ class BaseSearchkitForm(forms.Form):
     @cached_property
     def unprefixed_data(self):
         data = dict()
+        prefix = f'{self.prefix}-'
         for key, value in self.data.items():
-            if key.startswith(self.prefix):
-                data[key[len(self.prefix) + 1:]] = value
+            if key.startswith(prefix):
+                data[key[len(prefix):]] = value
         return data
 
     def _get_field_value(self, field_name):
-        # Get all choices values.
-        choices = self.fields[field_name].choices
-        flattened_choices = [c[0] for sublist in choices for c in sublist[1]]
+        field = self.fields[field_name]
 
         # Try the initial value first since it is already cleaned.
         if self.initial and field_name in self.initial:
@@ -225,17 +228,16 @@ class BaseSearchkitForm(forms.Form):
         # Otherwise look up the data dict.
         elif (
             field_name in self.unprefixed_data
-            and self.unprefixed_data[field_name] in flattened_choices
+            and field.valid_value(self.unprefixed_data[field_name])
         ):
             return self.unprefixed_data[field_name]
         else:
             # At a default return the first option which will be the selected
             # one.
-            return  flattened_choices[0]
+            return [c[0] for sublist in field.choices for c in sublist[1]][0]
 
     def _add_field_lookup_field(self):
-        choices = self.field_plan.get_field_lookup_choices()
-        field = forms.ChoiceField(label=_('Model field'), choices=choices)
+        field = FieldLookupField(self.field_plan, label=_('Model field'))
         field.widget.attrs.update(self.html_attrs)
         self.fields['field'] = field
 
@@ -247,8 +249,9 @@ class BaseSearchkitForm(forms.Form):
         self.fields['operator'] = field
 
     def _add_value_field(self):
+        field_lookup = self._get_field_value('field')
         operator = self._get_field_value('operator')
-        form_field = self.field_plan.get_form_field(operator)
+        form_field = self.field_plan.get_form_field(field_lookup, operator)
         self.fields['value'] = form_field
 
 
@@ -274,6 +277,53 @@ class BaseSearchkitFormSet(forms.BaseFormSet):
         else:
             return []
 
+    @cached_property
+    def field_plan(self):
+        """
+        A single field plan used by all forms of the formset.
+        """
+        return FieldPlan(self.model)
+
+    @cached_property
+    def unprefixed_data(self):
+        """
+        The data of all forms split by their index in a single pass. The form
+        prefixes are removed from the keys.
+        """
+        prefix = self.add_prefix('')
+        data = defaultdict(dict)
+        for key, value in self.data.items():
+            if key.startswith(prefix):
+                index, _, name = key[len(prefix):].partition('-')
+                data[index][name] = value
+        return data
+
+    def get_form_kwargs(self, index):
+        kwargs = super().get_form_kwargs(index)
+        kwargs['field_plan'] = self.field_plan
+        if self.is_bound and index is not None:
+            kwargs['unprefixed_data'] = self.unprefixed_data.get(str(index), dict())
+        return kwargs
+
+    def get_form(self, index):
+        """
+        Build a single form of the formset without building the others. Raise
+        IndexError if the formset has no form with this index.
+        """
+        if not 0 <= index < min(self.total_form_count(), self.max_num):
+            raise IndexError(f'Formset has no form with index {index}')
+        form = self.form(
+            data=self.data if self.is_bound else None,
+            auto_id=self.auto_id,
+            prefix=self.add_prefix(index),
+            error_class=self.error_class,
+            use_required_attribute=False,
+            renderer=self.renderer,
+            **self.get_form_kwargs(index),
+        )
+        self.add_fields(form, index)
+        return form
+
     @property
     def media(self):
         # We build a media collection including everything that might be needed
@@ -284,6 +334,7 @@ class BaseSearchkitFormSet(forms.BaseFormSet):
         media = forms.Media(
             js=[
             "searchkit/js/searchkit.js",
+            "searchkit/js/widgets/fieldlookup.js",
             "searchkit/js/widgets/fieldset.js",
             "searchkit/js/widgets/datetime.js",
             "searchkit/js/widgets/select2.js",
@@ -306,6 +357,7 @@ class BaseSearchkitFormSet(forms.BaseFormSet):
         context.update(
             sk_reload_css_class=RELOAD_CSS_CLASS,
             sk_reload_url=reverse('searchkit-reload'),
+            sk_catalog_url=reverse('searchkit-catalog'),
             sk_total_form_count=self.total_form_count,
         )
         return context
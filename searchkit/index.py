@@ -0,0 +1,190 @@
+import time
+import logging
+import threading
+from array import array
+from bisect import bisect_left
+from bisect import bisect_right
+from heapq import nsmallest
+from collections import defaultdict
+from collections import OrderedDict
+from django.conf import settings
+from django.db import connections
+from django.db import models
+from .cache import get_cache
+from .cache import get_cache_key
+from .cache import get_cardinality_timeout
+
+
+logger = logging.getLogger(__name__)
+
+
+class ValueIndex:
+    """
+    In-process index of the distinct values of a character field. Values are
+    held in sorted order and prefix matches are found by bisect. Candidates of
+    contains matches are narrowed down by trigram posting lists. Matches are
+    case-insensitive and ordered by value like the autocomplete view's
+    queryset. Note that values are compared by python and not by the
+    collation of your database.
+    """
+    def __init__(self, values, version=None):
+        self.version = version
+        self.values = sorted(values)
+        self.folded = [v.lower() for v in self.values]
+        # Folded values in sorted order together with their position.
+        self.prefixes = sorted((f, i) for i, f in enumerate(self.folded))
+        trigrams = defaultdict(list)
+        for i, folded in enumerate(self.folded):
+            for trigram in {folded[j:j + 3] for j in range(len(folded) - 2)}:
+                trigrams[trigram].append(i)
+        self.trigrams = {t: array('L', p) for t, p in trigrams.items()}
+
+    def __len__(self):
+        return len(self.values)
+
+    def _get_prefix_positions(self, term):
+        term = term.lower()
+        for j in range(bisect_left(self.prefixes, (term,)), len(self.prefixes)):
+            folded, i = self.prefixes[j]
+            if not folded.startswith(term):
+                break
+            yield i
+
+    def _get_contains_positions(self, term):
+        term = term.lower()
+        if len(term) < 3:
+            candidates = range(len(self.folded))
+        else:
+            # Each match is in the shortest posting list of the term's trigrams.
+            trigrams = {term[j:j + 3] for j in range(len(term) - 2)}
+            candidates = min((self.trigrams.get(t, ()) for t in trigrams), key=len)
+        for i in candidates:
+            folded = self.folded[i]
+            if term in folded and not folded.startswith(term):
+                yield i
+
+    def get_values(self, phase, term=None, after=None, limit=None, offset=0):
+        """
+        Return the values of a phase of the autocomplete view that are greater
+        than after. Phases are 'prefix' for values starting with the term,
+        'contains' for values only containing it and None for all values.
+        """
+        start = 0 if after is None else bisect_right(self.values, after)
+        start += offset
+        if phase is None:
+            stop = None if limit is None else start + limit
+            return self.values[start:stop]
+
+        if phase == 'prefix':
+            positions = self._get_prefix_positions(term)
+        elif phase == 'contains':
+            positions = self._get_contains_positions(term)
+        else:
+            raise ValueError(f'Unknown phase: {phase}')
+        positions = (i for i in positions if i >= start)
+        if limit is not None:
+            positions = nsmallest(limit, positions)
+        return [self.values[i] for i in sorted(positions)]
+
+
+# Indexes by model label and field name in the order of their last use.
+_value_indexes = OrderedDict()
+_building_indexes = set()
+# Fields with too many values by the time they are tried again.
+_oversized_indexes = dict()
+_lock = threading.Lock()
+
+
+def get_index_max_values():
+    return getattr(settings, 'SEARCHKIT_INDEX_MAX_VALUES', 100000)
+
+
+def get_index_max_total_values():
+    return getattr(settings, 'SEARCHKIT_INDEX_MAX_TOTAL_VALUES', 500000)
+
+
+def get_value_index(queryset, model_field, wait=False):
+    """
+    Return an up to date index of the values of a queryset or None. A missing
+    or outdated index is built in a background thread. Until it is ready the
+    database is asked. Pass wait=True to build it right away instead. The
+    data version of the cache tells us if an index is outdated. So without a
+    cache there is no index.
+    """
+    max_values = get_index_max_values()
+    if not max_values or not get_cache() or not isinstance(model_field, models.CharField):
+        return None
+
+    key = (queryset.model._meta.label_lower, model_field.attname)
+    if _oversized_indexes.get(key, 0) > time.monotonic():
+        return None
+
+    version = get_cache_key('index', queryset.model)
+    with _lock:
+        index = _value_indexes.get(key)
+        if index is not None and index.version == version:
+            _value_indexes.move_to_end(key)
+            return index
+        if not wait:
+            if key in _building_indexes:
+                return None
+            _building_indexes.add(key)
+
+    if wait:
+        return build_value_index(key, queryset, version, max_values)
+    _build_in_background(key, queryset, version, max_values)
+    return None
+
+
+def add_value_index(key, index):
+    """
+    Add an index dropping the least recently used ones to stay within
+    SEARCHKIT_INDEX_MAX_TOTAL_VALUES. Return False if the index alone exceeds
+    this budget.
+    """
+    max_total_values = get_index_max_total_values()
+    if len(index) > max_total_values:
+        return False
+    with _lock:
+        _value_indexes.pop(key, None)
+        total = sum(len(i) for i in _value_indexes.values())
+        while _value_indexes and total + len(index) > max_total_values:
+            total -= len(_value_indexes.popitem(last=False)[1])
+        _value_indexes[key] = index
+    return True
+
+
+def build_value_index(key, queryset, version, max_values):
+    """
+    Build and add the index of the values of a queryset. Return it or None if
+    the field has too many values.
+    """
+    try:
+        values = list(queryset[:max_values + 1])
+        if len(values) <= max_values:
+            index = ValueIndex(values, version)
+            if add_value_index(key, index):
+                return index
+        # Fields with too many values are not tried again for a while. Tables
+        # rarely shrink.
+        _oversized_indexes[key] = time.monotonic() + get_cardinality_timeout()
+    except Exception:
+        logger.exception('Could not build the value index of %s.%s', *key)
+    finally:
+        _building_indexes.discard(key)
+    return None
+
+
+def _build_in_background(key, queryset, version, max_values):
+    def build():
+        try:
+            build_value_index(key, queryset, version, max_values)
+        finally:
+            # Close the connections opened by this thread.
+            connections.close_all()
+    threading.Thread(target=build, daemon=True).start()
+
+
+def clear_value_indexes():
+    _value_indexes.clear()
+    _oversized_indexes.clear()
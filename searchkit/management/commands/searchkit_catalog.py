@@ -0,0 +1,35 @@
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from searchkit.utils import dump_field_catalogs
+from searchkit.utils import get_field_catalog_file
+from searchkit.utils import is_searchable_model
+
+
+class Command(BaseCommand):
+    help = 'Write the field catalogs of all searchable models to the searchkit field catalog file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-o', '--output',
+            help='Path of the catalog file. Defaults to the SEARCHKIT_FIELD_CATALOG_FILE setting.',
+        )
+        parser.add_argument(
+            '-l', '--language',
+            action='append',
+            dest='languages',
+            help='Language to build the catalogs for. Could be used multiple times. Defaults to LANGUAGE_CODE.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['output'] or get_field_catalog_file()
+        if not path:
+            raise CommandError('Use --output or the SEARCHKIT_FIELD_CATALOG_FILE setting to specify a path.')
+
+        languages = options['languages'] or [settings.LANGUAGE_CODE]
+        models = [m for m in apps.get_models() if is_searchable_model(m)]
+        dump_field_catalogs(path, models, languages)
+
+        msg = f'Wrote field catalogs for {len(models)} models and {len(languages)} languages to {path}.'
+        self.stdout.write(self.style.SUCCESS(msg))
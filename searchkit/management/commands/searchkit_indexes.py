@@ -0,0 +1,44 @@
+from django.db import router
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from searchkit.advisor import are_migrations_applied
+from searchkit.advisor import get_missing_indexes
+from searchkit.advisor import serialize_operations
+from searchkit.models import Search
+
+
+class Command(BaseCommand):
+    help = 'List the searchable model fields lacking a database index ranked by their uses in saved searches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-a', '--all',
+            action='store_true',
+            dest='include_unused',
+            help='Also list fields not used by any saved search.',
+        )
+        parser.add_argument(
+            '-m', '--migrations',
+            action='store_true',
+            help='Print the migration operations adding the missing indexes.',
+        )
+
+    def handle(self, *args, **options):
+        if not are_migrations_applied(router.db_for_read(Search)):
+            raise CommandError('Saved searches could not be read. Run "manage.py migrate" first.')
+
+        missing_indexes = get_missing_indexes(include_unused=options['include_unused'])
+        if not missing_indexes:
+            self.stdout.write(self.style.SUCCESS('No missing indexes found.'))
+            return
+
+        self.stdout.write(f'{"Uses":>6}  {"Status":<12}  Field')
+        for missing_index in missing_indexes:
+            self.stdout.write(f'{missing_index.uses:>6}  {missing_index.status:<12}  {missing_index}')
+            self.stdout.write(f'{"":>22}{", ".join(missing_index.field_lookups)}')
+
+        if options['migrations']:
+            for app_label, operations in serialize_operations(missing_indexes).items():
+                self.stdout.write(f'\n# Operations for the migrations of {app_label}:')
+                for operation in operations:
+                    self.stdout.write(operation)
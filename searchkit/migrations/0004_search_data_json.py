@@ -0,0 +1,53 @@
+from django.db import migrations
+import picklefield.fields
+import searchkit.models
+
+
+def pickle_to_json(apps, schema_editor):
+    Search = apps.get_model('searchkit', 'Search')
+    for search in Search.objects.using(schema_editor.connection.alias).iterator():
+        search.json_data = search.data
+        search.save(update_fields=['json_data'])
+
+
+def json_to_pickle(apps, schema_editor):
+    Search = apps.get_model('searchkit', 'Search')
+    for search in Search.objects.using(schema_editor.connection.alias).iterator():
+        search.data = search.json_data
+        search.save(update_fields=['data'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('searchkit', '0003_search_description'),
+    ]
+
+    operations = [
+        # Allow null values to make the removal of the field reversible.
+        migrations.AlterField(
+            model_name='search',
+            name='data',
+            field=picklefield.fields.PickledObjectField(editable=False, null=True, verbose_name='Serialized filter rule data'),
+        ),
+        migrations.AddField(
+            model_name='search',
+            name='json_data',
+            field=searchkit.models.SearchDataField(editable=False, null=True, verbose_name='Serialized filter rule data'),
+        ),
+        migrations.RunPython(pickle_to_json, json_to_pickle),
+        migrations.RemoveField(
+            model_name='search',
+            name='data',
+        ),
+        migrations.RenameField(
+            model_name='search',
+            old_name='json_data',
+            new_name='data',
+        ),
+        migrations.AlterField(
+            model_name='search',
+            name='data',
+            field=searchkit.models.SearchDataField(editable=False, verbose_name='Serialized filter rule data'),
+        ),
+    ]
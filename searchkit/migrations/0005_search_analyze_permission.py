@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:12
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('searchkit', '0004_search_data_json'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='search',
+            options={'permissions': [('analyze_search', 'Can explain searches with analyze')]},
+        ),
+    ]
@@ -1,22 +1,137 @@
-from picklefield.fields import PickledObjectField
+import copy
+import json
+import uuid
+import hashlib
+import datetime
+from decimal import Decimal
 from django.db import models
+from django.db import connections
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
 from django.contrib.contenttypes.models import ContentType
 from django.utils.translation import gettext_lazy as _
 from django.db.models import Q
+from django.db.models import Exists
+from django.db.models import OuterRef
 from .utils import FieldPlan
 from .utils import flatten_option_group_choices
 from .utils import get_value_representation
+from .utils import get_schema_hash
+from .utils import get_multi_valued_prefix
+from .utils import is_multi_valued_lookup
+from .utils import SearchSchema
+from .optimizer import get_logical_operator
+from .optimizer import optimize_rules
+from .optimizer import rewrite_rule
+
+
+# Q objects of saved searches by their primary key together with the key of
+# the state they were built from.
+_search_q_cache = dict()
+
+
+VALUE_ENCODERS = (
+    # Check datetime before date since it is a subclass of date.
+    (datetime.datetime, 'datetime', lambda v: v.isoformat()),
+    (datetime.date, 'date', lambda v: v.isoformat()),
+    (datetime.time, 'time', lambda v: v.isoformat()),
+    (Decimal, 'decimal', str),
+    (uuid.UUID, 'uuid', str),
+)
+VALUE_DECODERS = {
+    'datetime': datetime.datetime.fromisoformat,
+    'date': datetime.date.fromisoformat,
+    'time': datetime.time.fromisoformat,
+    'decimal': Decimal,
+    'uuid': uuid.UUID,
+}
+
+
+def encode_value(value):
+    """
+    Encode values json cannot represent as objects holding their type.
+    """
+    if isinstance(value, (list, tuple)):
+        return [encode_value(v) for v in value]
+    for klass, type_name, encode in VALUE_ENCODERS:
+        if isinstance(value, klass):
+            return {'$type': type_name, 'value': encode(value)}
+    return value
+
+
+def decode_value(value):
+    if isinstance(value, list):
+        return [decode_value(v) for v in value]
+    elif isinstance(value, dict):
+        return VALUE_DECODERS[value['$type']](value['value'])
+    return value
+
+
+class SearchDataField(models.JSONField):
+    """
+    Json field for the filter rules of a search. Rules are stored together
+    with the version of their schema and values are encoded with their type.
+    The field's value is the list of rules as it is returned by the cleaned
+    data of the searchkit formset.
+    """
+    VERSION = 1
+
+    def encode(self, rules):
+        rules = [dict(rule, value=encode_value(rule.get('value'))) for rule in rules]
+        return dict(version=self.VERSION, rules=rules)
+
+    def decode(self, data):
+        if data is None or isinstance(data, list):
+            return data
+        if data.get('version') != self.VERSION:
+            raise ValueError(f"Unknown version of search data: {data.get('version')}")
+        return [dict(rule, value=decode_value(rule.get('value'))) for rule in data['rules']]
+
+    def from_db_value(self, value, expression, connection):
+        return self.decode(super().from_db_value(value, expression, connection))
+
+    def get_db_prep_save(self, value, connection):
+        # Only encode values being saved. Lookups work on the encoded data.
+        if isinstance(value, (list, tuple)):
+            value = self.encode(value)
+        return super().get_db_prep_save(value, connection)
+
+    def to_python(self, value):
+        if isinstance(value, dict):
+            return self.decode(value)
+        return super().to_python(value)
+
+    def value_to_string(self, obj):
+        value = self.value_from_object(obj)
+        return self.encode(value) if isinstance(value, (list, tuple)) else value
+
+
+class SearchQuerySet(models.QuerySet):
+    def touching_field(self, field_lookup):
+        """
+        Return searches with a filter rule for the field lookup. On databases
+        without support for json containment we filter in python.
+        """
+        if connections[self.db].features.supports_json_field_contains:
+            return self.filter(data__rules__contains=[{'field': field_lookup}])
+        pks = [pk for pk, data in self.values_list('pk', 'data') if any(r['field'] == field_lookup for r in data)]
+        return self.filter(pk__in=pks)
 
 
 class Search(models.Model):
     name = models.CharField(_('Search name'), max_length=255)
     description = models.TextField(_('Description'), blank=True)
     contenttype = models.ForeignKey(ContentType, on_delete=models.CASCADE, verbose_name=_('Model'))
-    data = PickledObjectField(_('Serialized filter rule data'))
+    data = SearchDataField(_('Serialized filter rule data'), editable=False)
     created_date = models.DateTimeField(auto_now_add=True)
 
+    objects = SearchQuerySet.as_manager()
+
     class Meta:
         unique_together = ('name', 'contenttype')
+        permissions = [
+            ('analyze_search', _('Can explain searches with analyze')),
+        ]
 
     @property
     def details(self):
@@ -24,29 +139,113 @@ class Search(models.Model):
         Get a detailed string representation of the search.
         """
         details = 'WHERE '
+        model = self.contenttype.model_class()
+        field_plan = FieldPlan(model)
+        field_hints = SearchSchema(model).field_hints
         for data in self.data:
             if data.get('logical_operator'):
                 details += data["logical_operator"].upper() + ' '
             if data.get('negation'):
                 details += 'NOT '
 
-            field_plan = FieldPlan(self.contenttype.model_class(), initial=data)
-            field_choices = flatten_option_group_choices(field_plan.get_field_lookup_choices())
-            field_label = dict(field_choices).get(data['field'], data['field'])
+            field_label = field_plan.get_field_lookup_label(data['field'])
             operator_choices = flatten_option_group_choices(field_plan.get_operator_choices(data['field']))
             operator_label = dict(operator_choices).get(data['operator'], data['operator'])
             value_repr = get_value_representation(data['value'])
-            details += f'{field_label} | {operator_label} | {value_repr}\n'
+            details += f'{field_label} | {operator_label} | {value_repr}'
+
+            # The hints of a field might change what a rule matches. So we show
+            # the lookups it is searched by.
+            lookups = rewrite_rule(data, field_hints.get(data['field'], {}))
+            if lookups != {f'{data["field"]}__{data["operator"]}': data['value']}:
+                lookups = ', '.join(f'{l} {get_value_representation(v)}' for l, v in lookups.items())
+                details += f' ({_("searched as")} {lookups})'
+            details += '\n'
 
         return details.strip()
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_saved_data()
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._remember_saved_data()
+
+    def _remember_saved_data(self):
+        # Q objects are only cached for the data a search was saved with. Data
+        # assigned later, e.g. by a form, is never cached.
+        self._saved_data = self.__dict__.get('data')
+        if self._saved_data is None:
+            self._saved_key = None
+        else:
+            data = self._meta.get_field('data').encode(self._saved_data)
+            data_hash = hashlib.sha1(json.dumps(data, sort_keys=True).encode('utf-8')).hexdigest()
+            self._saved_key = (self.pk, self.contenttype_id, data_hash)
+
     def as_q(self):
         """
-        Build a Q object from the serialized data.
+        Return a Q object for the serialized data. Q objects of saved searches
+        are cached by their primary key, model and the data they were saved
+        with until the schema changes. Each call returns a copy of its own.
         """
+        saved_key = getattr(self, '_saved_key', None)
+        if (
+            saved_key is None
+            or self.data is not self._saved_data
+            or (self.pk, self.contenttype_id) != saved_key[:2]
+        ):
+            return self.build_q()
+
+        key = (saved_key, get_schema_hash())
+        cached = _search_q_cache.get(self.pk)
+        if cached is None or cached[0] != key:
+            cached = _search_q_cache[self.pk] = (key, self.build_q())
+        return copy.deepcopy(cached[1])
+
+    def build_q(self):
+        """
+        Build a Q object from the serialized data. The rules are simplified
+        and rewritten to use the indexes of their fields. Rules following
+        to-many relations are compiled into exists subqueries. So the Q object
+        never multiplies the rows of a queryset and no distinct is needed.
+        """
+        model = ContentType.objects.get_for_id(self.contenttype_id).model_class()
+        # The model of a stale content type is gone. So nothing matches.
+        if model is None:
+            return Q(pk__in=[])
+
+        field_hints = SearchSchema(model).field_hints
+        rules = optimize_rules(model, self.data)
+        # And-ed rules over the same to-many relation must be matched by the
+        # same related object. So they are grouped into a single exists
+        # subquery. Other rules match on their own, just like negated rules.
+        # If all rules are and-ed their order does not matter. Otherwise only
+        # neighbouring rules are grouped.
+        only_and = all(get_logical_operator(data) == 'and' for data in rules[1:])
+        groups = []
+        groups_by_prefix = dict()
+        for data in rules:
+            new_q = Q(**rewrite_rule(data, field_hints.get(data['field'], {})))
+            prefix = get_multi_valued_prefix(model, data['field'])
+            if data.get('negation') or (groups and get_logical_operator(data) != 'and'):
+                prefix = None
+            if prefix in groups_by_prefix:
+                groups_by_prefix[prefix][1] &= new_q
+            else:
+                if not only_and:
+                    groups_by_prefix.clear()
+                groups.append([data, new_q, prefix])
+                if prefix:
+                    groups_by_prefix[prefix] = groups[-1]
+
         q = Q()
-        for data in self.data:
-            new_q = Q(**{f'{data["field"]}__{data["operator"]}': data['value']})
+        for data, new_q, prefix in groups:
+            if is_multi_valued_lookup(model, data['field']):
+                subquery = model._base_manager.filter(new_q, pk=OuterRef('pk'))
+                new_q = Q(Exists(subquery))
 
             # Negate the new Q object if negation is set.
             if data.get('negation'):
@@ -54,7 +253,7 @@ class Search(models.Model):
 
             # Combine the new Q object with the existing one using the logical
             # operator or 'and' by default.
-            operator = data.get('logical_operator') or 'and'
+            operator = get_logical_operator(data)
             if operator == 'and':
                 q &= new_q
             elif operator == 'or':
@@ -63,3 +262,8 @@ class Search(models.Model):
                 q ^= new_q
 
         return q
+
+
+@receiver(post_delete, sender=Search)
+def clear_search_q_cache(sender, instance, **kwargs):
+    _search_q_cache.pop(instance.pk, None)
@@ -0,0 +1,222 @@
+import datetime
+import django
+from django.core.exceptions import FieldDoesNotExist
+from django.utils import timezone
+from .utils import is_multi_valued_lookup
+
+
+REGEX_METACHARACTERS = set('.^$*+?{}[]|()\\')
+
+# Case-insensitive operators and their case-sensitive versions.
+CASE_SENSITIVE_OPERATORS = {
+    'iexact': 'exact',
+    'icontains': 'contains',
+    'istartswith': 'startswith',
+    'iendswith': 'endswith',
+}
+
+CASE_NORMALIZERS = {
+    'lower': str.lower,
+    'upper': str.upper,
+}
+
+# Fields to truncate and the length of the interval for each precision.
+DATETIME_PRECISIONS = {
+    'day': (dict(hour=0, minute=0, second=0, microsecond=0), datetime.timedelta(days=1)),
+    'hour': (dict(minute=0, second=0, microsecond=0), datetime.timedelta(hours=1)),
+    'minute': (dict(second=0, microsecond=0), datetime.timedelta(minutes=1)),
+}
+
+
+def get_logical_operator(rule):
+    return rule.get('logical_operator') or 'and'
+
+
+def get_rule_key(rule):
+    return (rule['field'], rule['operator'], rule['value'], bool(rule.get('negation')))
+
+
+def get_equality_values(rule):
+    return list(rule['value']) if rule['operator'] == 'in' else [rule['value']]
+
+
+def has_null_value(rule):
+    # Django turns exact None into isnull but drops None from in lists. So
+    # merging them would change the results.
+    return None in get_equality_values(rule)
+
+
+def is_equality(rule):
+    return rule['operator'] in ('exact', 'in') and not rule.get('negation') and not has_null_value(rule)
+
+
+def has_strings(values):
+    # The database might compare strings differently than python does, e.g.
+    # with case-insensitive collations. So we do not reason about them.
+    return any(isinstance(v, str) for v in values)
+
+
+def is_nullable(model, field_lookup):
+    # Fields of related models could be null due to a missing relation.
+    if '__' in field_lookup:
+        return True
+    try:
+        return model._meta.get_field(field_lookup).null
+    except FieldDoesNotExist:
+        return True
+
+
+def build_equality_rule(rule, values):
+    unique_values = []
+    for value in values:
+        if value not in unique_values:
+            unique_values.append(value)
+    if len(unique_values) == 1:
+        return dict(rule, operator='exact', value=unique_values[0])
+    else:
+        return dict(rule, operator='in', value=unique_values)
+
+
+def merge_rules(model, previous, rule, is_first):
+    """
+    Merge a rule into the previous one. Return the list of rules replacing
+    the previous one or None if they could not be merged.
+    """
+    operator = get_logical_operator(rule)
+
+    # Rules are combined from left to right. So the previous rule could only
+    # be merged if it is combined with the rules before it the same way.
+    if not is_first and get_logical_operator(previous) != operator:
+        return None
+    if previous['field'] != rule['field']:
+        return None
+
+    # Duplicate rules. Xor-ing a rule twice gives the rules before it. But
+    # only if xor is true for an odd number of true operands, which django
+    # emulates since 5.0. A null operand would make the native xor of some
+    # backends null.
+    if get_rule_key(previous) == get_rule_key(rule):
+        if operator in ('and', 'or'):
+            return [previous]
+        elif (
+            not is_first
+            and django.VERSION >= (5, 0)
+            and not has_null_value(rule)
+            and not is_nullable(model, rule['field'])
+        ):
+            return []
+
+    # Rules over to-many relations might be matched by different related
+    # objects.
+    single_valued = not is_multi_valued_lookup(model, rule['field'])
+
+    if is_equality(previous) and is_equality(rule):
+        values, other_values = get_equality_values(previous), get_equality_values(rule)
+        if operator == 'or':
+            return [build_equality_rule(previous, values + other_values)]
+        elif single_valued and not has_strings(values + other_values):
+            common_values = [v for v in values if v in other_values]
+            # Exclusive rules could be or-ed instead.
+            if operator == 'xor' and not common_values:
+                return [build_equality_rule(previous, values + other_values)]
+            # A contradiction matches nothing. But for null values it is null
+            # and not false, which matters to the xor of some backends.
+            elif operator == 'and' and (common_values or not is_nullable(model, rule['field'])):
+                return [build_equality_rule(previous, common_values)]
+
+    if operator == 'and' and single_valued and not previous.get('negation') and not rule.get('negation'):
+        bounds = {previous['operator']: previous['value'], rule['operator']: rule['value']}
+        if set(bounds) == {'gte', 'lte'}:
+            return [dict(previous, operator='range', value=[bounds['gte'], bounds['lte']])]
+
+    return None
+
+
+def optimize_rules(model, rules):
+    """
+    Simplify the rules of a search without changing its results. Or-ed
+    equalities of a field are merged into a single in lookup, and-ed bounds
+    into a range lookup. Duplicate and contradictory rules are removed and
+    xor-ed exclusive rules are or-ed.
+    """
+    optimized = []
+    for rule in rules:
+        while optimized:
+            merged = merge_rules(model, optimized[-1], rule, len(optimized) == 1)
+            if merged is None:
+                break
+            optimized.pop()
+            # The merged rule might be merged with the one before it.
+            if merged:
+                rule = merged[0]
+            else:
+                rule = None
+                break
+        if rule is not None:
+            optimized.append(rule)
+    return optimized
+
+
+def get_regex_literal(pattern):
+    """
+    Return the literal of a regular expression anchored at the start of the
+    value and whether it is anchored at its end by \\Z too. Return None if
+    the pattern is not such a literal.
+    """
+    if not pattern.startswith('^'):
+        return None
+    chars = iter(pattern[1:])
+    literal = []
+    for char in chars:
+        if char == '\\':
+            char = next(chars, None)
+            # The end anchor must be the last character. Unlike $ it does
+            # not match before a trailing newline.
+            if char == 'Z':
+                if next(chars, None) is not None:
+                    return None
+                return ''.join(literal), True
+            # Only escaped metacharacters are literals. Others like \d are not.
+            if char not in REGEX_METACHARACTERS:
+                return None
+        elif char in REGEX_METACHARACTERS:
+            return None
+        literal.append(char)
+    return ''.join(literal), False
+
+
+def rewrite_rule(rule, hints):
+    """
+    Return the lookups of a rule rewritten to be able to use the indexes of
+    the field. The hints of the field lookup control the rewrites:
+
+    * prefix: Anchored literal regular expressions become startswith or exact
+      lookups. Use it if the field's index supports prefix matches.
+    * case: The values of the field are normalized to 'lower' or 'upper' case.
+      Case-insensitive operators become their case-sensitive versions.
+    * precision: Equality of datetimes matches the whole 'day', 'hour' or
+      'minute' of the value. It becomes a half-open range.
+    """
+    field, operator, value = rule['field'], rule['operator'], rule['value']
+
+    if hints.get('prefix') and operator in ('regex', 'iregex'):
+        if literal := get_regex_literal(value):
+            value, anchored = literal
+            if operator == 'regex':
+                operator = 'exact' if anchored else 'startswith'
+            else:
+                operator = 'iexact' if anchored else 'istartswith'
+
+    if (normalize := CASE_NORMALIZERS.get(hints.get('case'))) and operator in CASE_SENSITIVE_OPERATORS:
+        operator, value = CASE_SENSITIVE_OPERATORS[operator], normalize(value)
+
+    if (precision := DATETIME_PRECISIONS.get(hints.get('precision'))) and operator == 'exact':
+        if isinstance(value, datetime.datetime):
+            # Truncate the value in the current timezone.
+            if timezone.is_aware(value):
+                value = timezone.localtime(value)
+            truncate, length = precision
+            start = value.replace(**truncate)
+            return {f'{field}__gte': start, f'{field}__lt': start + length}
+
+    return {f'{field}__{operator}': value}
@@ -3,6 +3,7 @@
 {
 
     // This script is used to reload the formset when the searchkit is reloaded.
+    // Changes within a single searchkit form only reload this form.
 
     class SearchkitFormset {
 
@@ -10,63 +11,238 @@
             this.formset = document.getElementById('searchkit_formset');
             this.form = this.formset.closest('form');
             this.modelField = this.form.querySelector('select[name="searchkit_model"]');
-            this.fieldsets = this.formset.querySelectorAll('fieldset');
             this.baseUrl = this.formset.dataset.url;
+            this.catalogUrl = this.formset.dataset.catalogUrl;
             this.reloadCssClass = this.formset.dataset.reloadCssClass;
-            this.totalFormsInput = this.form.querySelector('input[name$="TOTAL_FORMS"]');
+            // Delay of requests in milliseconds. Each change within the delay
+            // restarts it. So rapid changes result in a single request.
+            this.delay = 150;
+            // Pending requests by their target.
+            this.pending = new Map();
+            // Most recently used html fragments by their url. Only fragments
+            // which do not depend on the data are kept.
+            this.fragments = new Map();
+            this.maxFragments = 20;
+            this.addReloadListeners(this.form);
+            this.loadCatalog();
+        }
+
+        get totalFormsInput () {
+            // The management form is replaced with each reload of the formset.
+            return this.form.querySelector('input[name$="TOTAL_FORMS"]');
+        }
 
-            // Set event listener for reloading the formset.
-            this.form.querySelectorAll(`.${this.reloadCssClass}`).forEach((el) => {
+        addReloadListeners (root) {
+            // Set event listener for reloading the formset or a single form.
+            root.querySelectorAll(`.${this.reloadCssClass}`).forEach((el) => {
                 const totalFormsCount = el.dataset.totalForms;
                 const reloadHandler = el.dataset.reloadHandler;
+                const searchkitForm = el.closest('.searchkit-form');
 
                 el.addEventListener(reloadHandler, (e) => {
                     e.preventDefault();
                     // Update total forms count if a form is added or removed.
                     if (totalFormsCount) this.totalFormsInput.value = parseInt(totalFormsCount);
-                    // Only reload if a model is selected.
-                    if (this.modelField.value) {
-                        this.reload()
-                    // Otherwise remove all fieldsets.
+                    // Remove all fieldsets if no model is selected.
+                    if (!this.modelField.value) {
+                        this.abortAll();
+                        this.formset.querySelectorAll('fieldset').forEach((fs) => { fs.remove() });
+                    // Update the form the element belongs to. If the field
+                    // catalog could not do it we reload the form. A pending
+                    // reload of the formset would override it though.
+                    } else if (searchkitForm && !this.pending.has('formset')) {
+                        if (this.updateForm(searchkitForm)) {
+                            this.abort(`form-${searchkitForm.dataset.index}`);
+                        } else {
+                            this.reloadForm(searchkitForm);
+                        }
+                    // Otherwise reload the whole formset.
                     } else {
-                        this.fieldsets.forEach((fs) => { fs.remove() });
+                        this.reload();
                     }
                 });
             });
         }
 
-        reload () {
-            const urlParams = new URLSearchParams(new FormData(this.form)).toString();
-            const url = `${this.baseUrl}?${urlParams}`;
-
-            fetch(url, {
+        loadCatalog () {
+            // The catalog of field lookups, operators and value widgets of the
+            // selected model. The browser revalidates it using its etag.
+            this.catalog = null;
+            if (!this.catalogUrl || !this.modelField.value) return;
+            const urlParams = new URLSearchParams({searchkit_model: this.modelField.value});
+            fetch(`${this.catalogUrl}?${urlParams.toString()}`, {
                 method: 'GET',
                 credentials: 'same-origin',
-                headers: {'Accept': 'text/html'},
+                headers: {'Accept': 'application/json'},
             })
             .then(response => {
                 if (response.ok) {
-                    return response.text()
+                    return response.json()
                 } else {
                     throw response;
                 }
             })
-            .then(html => {
-                // Get dom element from html string.
-                const wrapper = document.createElement('div');
-                wrapper.innerHTML = html;
-                const formset = wrapper.firstChild;
-                // Replace the formset dom element.
-                this.formset.replaceWith(formset);
-                // Reinitialize the formset object itself.
-                window.SearchkitFormset = new SearchkitFormset()
-                // Trigger reloaded event.
-                document.dispatchEvent(new Event("searchkit:reloaded"));
+            .then(catalog => {
+                this.catalog = catalog;
             })
             .catch(error => {
                 console.error('AJAX GET request failed:', error);
             });
         }
+
+        updateForm (searchkitForm) {
+            // Switch the operator and value widgets of a form using the field
+            // catalog. Return false if we need the server to do it.
+            if (!this.catalog) return false;
+            const lookupField = searchkitForm.querySelector('.field-field select');
+            const operatorField = searchkitForm.querySelector('.field-operator select');
+            const operators = this.catalog.operators[lookupField.value];
+            if (!operators) return false;
+
+            // Rebuild the operator options and keep the selected operator if
+            // possible.
+            const operator = operatorField.value;
+            // Options without a group are not wrapped by an optgroup.
+            operatorField.replaceChildren(...operators.filter(([group, options]) => options.length)
+                .flatMap(([group, options]) => {
+                    options = options.map(([value, label]) => new Option(label, value, false, value === operator));
+                    if (group === null) return options;
+                    const optgroup = document.createElement('optgroup');
+                    optgroup.label = group;
+                    optgroup.append(...options);
+                    return [optgroup];
+                }));
+
+            // Value widgets depending on the data are not part of the catalog.
+            const widget = this.catalog.widgets[this.catalog.values[lookupField.value][operatorField.value]];
+            if (widget === undefined) return false;
+
+            // Replace everything behind the label of the value field.
+            const label = searchkitForm.querySelector('.field-value label');
+            while (label.nextSibling) label.nextSibling.remove();
+            label.insertAdjacentHTML('afterend', widget.replaceAll('__prefix__', searchkitForm.dataset.prefix));
+
+            // Only the value widget is new. The rest of the form is already
+            // initialized and must not get its listeners twice.
+            const detail = {root: label.parentElement, partial: true};
+            document.dispatchEvent(new CustomEvent("searchkit:reloaded", {detail: detail}));
+            return true;
+        }
+
+        fetchElement (urlParams, signal) {
+            const url = `${this.baseUrl}?${urlParams.toString()}`;
+            let html = this.fragments.get(url);
+            let promise;
+            if (html !== undefined) {
+                this.remember(url, html);
+                promise = Promise.resolve(html);
+            } else {
+                promise = fetch(url, {
+                    method: 'GET',
+                    credentials: 'same-origin',
+                    headers: {'Accept': 'text/html'},
+                    signal: signal,
+                })
+                .then(response => {
+                    if (!response.ok) throw response;
+                    // Fragments holding choices taken from the data must be
+                    // revalidated by the server with each request.
+                    const memoize = response.headers.get('X-Searchkit-Memoize') !== '0';
+                    return response.text().then(html => {
+                        if (memoize) this.remember(url, html);
+                        return html;
+                    });
+                });
+            }
+            return promise.then(html => {
+                // Get dom element from html string.
+                const wrapper = document.createElement('div');
+                wrapper.innerHTML = html;
+                return wrapper.firstElementChild;
+            });
+        }
+
+        remember (url, html) {
+            // Move the fragment to the end and drop the least recently used
+            // one if there are too many.
+            this.fragments.delete(url);
+            this.fragments.set(url, html);
+            if (this.fragments.size > this.maxFragments) {
+                this.fragments.delete(this.fragments.keys().next().value);
+            }
+        }
+
+        request (key, urlParams, callback) {
+            // Debounce requests for the same target. A new request supersedes
+            // a pending one. So responses are never applied out of order.
+            this.abort(key);
+            const controller = new AbortController();
+            const timeout = setTimeout(() => {
+                this.fetchElement(urlParams, controller.signal)
+                .then(element => {
+                    if (controller.signal.aborted) return;
+                    this.pending.delete(key);
+                    callback(element);
+                })
+                .catch(error => {
+                    if (error.name === 'AbortError') return;
+                    this.pending.delete(key);
+                    console.error('AJAX GET request failed:', error);
+                });
+            }, this.delay);
+            this.pending.set(key, {controller: controller, timeout: timeout});
+        }
+
+        abort (key) {
+            const pending = this.pending.get(key);
+            if (pending) {
+                clearTimeout(pending.timeout);
+                pending.controller.abort();
+                this.pending.delete(key);
+            }
+        }
+
+        abortAll () {
+            Array.from(this.pending.keys()).forEach((key) => this.abort(key));
+        }
+
+        replace (oldElement, newElement, partial) {
+            oldElement.replaceWith(newElement);
+            this.addReloadListeners(newElement);
+            // Trigger reloaded event passing the new element to initialize.
+            const detail = {root: newElement, partial: partial};
+            document.dispatchEvent(new CustomEvent("searchkit:reloaded", {detail: detail}));
+        }
+
+        reload () {
+            // A reload of the formset supersedes all pending requests.
+            this.abortAll();
+            const urlParams = new URLSearchParams(new FormData(this.form));
+            this.request('formset', urlParams, (formset) => {
+                this.replace(this.formset, formset, false);
+                this.formset = formset;
+                // The model might have changed.
+                this.loadCatalog();
+            });
+        }
+
+        reloadForm (searchkitForm) {
+            // We only send the data of the searchkit form in question, the
+            // model and the management form.
+            const prefix = `${searchkitForm.dataset.prefix}-`;
+            const urlParams = new URLSearchParams();
+            for (const [key, value] of new FormData(this.form)) {
+                if (key === 'searchkit_model' || key.startsWith(prefix) || key.endsWith('_FORMS')) {
+                    urlParams.append(key, value);
+                }
+            }
+            urlParams.append('sk_reload_form', searchkitForm.dataset.index);
+
+            this.request(`form-${searchkitForm.dataset.index}`, urlParams, (form) => {
+                // The form might have been replaced by now.
+                if (searchkitForm.isConnected) this.replace(searchkitForm, form, true);
+            });
+        }
     }
 
     document.addEventListener("DOMContentLoaded", function () {
@@ -4,6 +4,22 @@
 
 {
 
-    document.addEventListener("searchkit:reloaded", (e) => DateTimeShortcuts.init());
+    function initDateTimeShortcuts (root) {
+        // Same as DateTimeShortcuts.init() but limited to the reloaded element.
+        // Otherwise widgets that were not reloaded would get their shortcuts
+        // twice.
+        root.querySelectorAll('input[type="text"]').forEach((inp) => {
+            if (inp.classList.contains('vTimeField')) {
+                DateTimeShortcuts.addClock(inp);
+                DateTimeShortcuts.addTimezoneWarning(inp);
+            }
+            else if (inp.classList.contains('vDateField')) {
+                DateTimeShortcuts.addCalendar(inp);
+                DateTimeShortcuts.addTimezoneWarning(inp);
+            }
+        });
+    }
+
+    document.addEventListener("searchkit:reloaded", (e) => initDateTimeShortcuts(e.detail.root));
 
 }
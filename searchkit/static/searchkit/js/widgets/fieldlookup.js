@@ -0,0 +1,21 @@
+"use strict";
+
+// The field lookup selects only render their selected option. We add the
+// options shared by all of them from the template of the formset.
+
+{
+
+    function initFieldLookups (root) {
+        const template = document.getElementById('searchkit_field_options');
+        if (!template) return;
+        root.querySelectorAll('.field-field select').forEach((select) => {
+            const value = select.value;
+            select.replaceChildren(template.content.cloneNode(true));
+            select.value = value;
+        });
+    }
+
+    document.addEventListener("DOMContentLoaded", (e) => initFieldLookups(document));
+    document.addEventListener("searchkit:reloaded", (e) => initFieldLookups(e.detail.root));
+
+}
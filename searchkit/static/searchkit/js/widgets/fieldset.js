@@ -147,7 +147,32 @@
         });
     }
 
+    function initFormFieldsets(root) {
+        // Initialize the fieldsets of a single reloaded form. Their position
+        // within all searchkit fieldsets is their index.
+        const elements = Array.from(document.querySelectorAll('fieldset.searchkit'));
+        root.querySelectorAll('fieldset.searchkit').forEach((el) => {
+            const index = elements.indexOf(el);
+            let fieldset;
+            if (el.classList.contains('filter-logic')) {
+                fieldset = new LogicFormFieldset(el, index);
+            } else if (el.classList.contains('filter-rule')) {
+                fieldset = new FilterRuleFieldset(el, index);
+            }
+            // Keep the collapse state the fieldset had before the reload.
+            if (fieldset && fieldset.collapsible && fieldsetStates[fieldset.id]) {
+                fieldset.details.open = true;
+            }
+        });
+    }
+
     let fieldsetStates = {};
     document.addEventListener("DOMContentLoaded", function (e) {initFieldsets(false)});
-    document.addEventListener("searchkit:reloaded", function (e) {initFieldsets(true)});
+    document.addEventListener("searchkit:reloaded", function (e) {
+        if (e.detail.partial) {
+            initFormFieldsets(e.detail.root);
+        } else {
+            initFieldsets(true);
+        }
+    });
 }
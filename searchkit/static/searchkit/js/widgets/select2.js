@@ -4,11 +4,27 @@
 
 {
 
-    function initSelect2 () {
-        django.jQuery('.admin-autocomplete').each((i, el) => {
-            django.jQuery(el).select2()
+    function initSelect2 (root) {
+        django.jQuery(root).find('.searchkit-autocomplete').each((i, el) => {
+            // The autocomplete view returns a cursor with each page. We pass it
+            // back when select2 asks for the next page.
+            let cursor = null;
+            django.jQuery(el).select2({
+                ajax: {
+                    data: (params) => {
+                        if (!params.page || params.page === 1) cursor = null;
+                        return {term: params.term, page: params.page, cursor: cursor};
+                    },
+                    processResults: (data) => {
+                        cursor = data.pagination.cursor;
+                        return data;
+                    },
+                },
+            });
         });
     }
-    document.addEventListener("searchkit:reloaded", (e) => initSelect2());
+    document.addEventListener("DOMContentLoaded", (e) => initSelect2(document));
+    // Only initialize the widgets of the reloaded element.
+    document.addEventListener("searchkit:reloaded", (e) => initSelect2(e.detail.root));
 
 }
@@ -1,24 +1,63 @@
-import os, sys, json
+import os, io, sys, json, time, tempfile, datetime, uuid
 from pprint import pprint
 from decimal import Decimal
 from contextlib import contextmanager
+from unittest import mock
 from urllib.parse import urlencode
+from django import forms
 from django.test import TestCase
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.core.management import call_command
+from django.core.management import CommandError
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.auth.models import User
+from django.contrib.auth.models import Permission
+from django.contrib.admin.models import LogEntry
 from django.urls import reverse
-from example.models import ModelA, ModelB
+from django.http import QueryDict
+from django.utils.http import urlsafe_base64_encode
+from example.models import ModelA, ModelB, ModelC, ModelD
 from example.management.commands.createtestdata import Command as CreateTestData
+from example.admin import ModelAAdmin, ModelCAdmin
 from searchkit.forms import FieldPlan
 from searchkit.utils import ModelTree
+from searchkit.utils import FieldCatalog
+from searchkit.utils import get_field_catalog
+from searchkit.utils import clear_field_catalogs
+from searchkit.utils import load_field_catalog_file
+from searchkit.utils import get_searchable_models
+from searchkit.utils import get_searchable_contenttype_ids
+from searchkit.utils import clear_searchable_models
+from searchkit.filters import SearchkitFilter
+from searchkit.admin import FULL_SCAN_PATTERNS
 from searchkit.forms import SearchForm
 from searchkit.forms import SearchkitModelForm
 from searchkit.forms import BaseSearchkitFormSet
 from searchkit.forms import searchkit_formset_factory
 from searchkit.models import Search
+from searchkit.optimizer import optimize_rules
+from searchkit.optimizer import rewrite_rule
+from searchkit.advisor import get_missing_indexes
+from searchkit.checks import check_missing_indexes
+from searchkit.checks import check_shared_cache
 from searchkit.views import AutocompleteView
+from searchkit.fields import Select2Field
+from searchkit.fields import MultiSelect2Field
+from searchkit.widgets import FieldLookupSelect
+from searchkit.cache import get_cache
+from searchkit.cache import get_cache_key
+from searchkit.cache import invalidate_data_version
+from searchkit.index import ValueIndex
+from searchkit.index import build_value_index
+from searchkit.index import get_value_index
+from searchkit.index import clear_value_indexes
 from searchkit import __version__
 from django.db.models import Q
+from django.utils import translation
+from django.utils import timezone
+from django.core.exceptions import FieldDoesNotExist
 
 
 # Check django version.
@@ -223,6 +262,222 @@ class CreateTestDataMixin:
             CreateTestData().handle()
 
 
+class FieldCatalogTestCase(TestCase):
+    def test_catalog_is_cached(self):
+        catalog = get_field_catalog(ModelA)
+        self.assertIs(catalog, get_field_catalog(ModelA))
+        self.assertIsNot(catalog, get_field_catalog(ModelB))
+
+        # Field plans use the cached catalog.
+        field_plan = FieldPlan(ModelA)
+        self.assertIs(field_plan.catalog, catalog)
+        self.assertIs(field_plan.get_field_lookup_choices(), catalog.choices)
+
+    def test_catalog_per_language(self):
+        with translation.override('en'):
+            catalog_en = get_field_catalog(ModelA)
+        with translation.override('de'):
+            catalog_de = get_field_catalog(ModelA)
+        self.assertIsNot(catalog_en, catalog_de)
+
+    def test_clear_catalogs(self):
+        catalog = get_field_catalog(ModelA)
+        clear_field_catalogs()
+        self.assertIsNot(catalog, get_field_catalog(ModelA))
+
+    def test_catalog_model_fields(self):
+        catalog = get_field_catalog(ModelA)
+        lookups = [c[0] for g in catalog.choices for c in g[1]]
+        self.assertEqual(lookups, list(catalog.model_fields))
+        self.assertEqual(catalog.model_fields['model_b__model_c__chars'].model.__name__, 'ModelC')
+
+    def test_operator_choices_are_cached(self):
+        field_plan = FieldPlan(ModelA)
+        choices = field_plan.get_operator_choices('chars')
+        self.assertIs(choices, FieldPlan(ModelA).get_operator_choices('chars'))
+        self.assertEqual(field_plan.get_model_field('chars'), ModelA._meta.get_field('chars'))
+
+    def test_invalid_field_lookup(self):
+        field_plan = FieldPlan(ModelA)
+        with self.assertRaises(FieldDoesNotExist):
+            field_plan.get_operator_choices('model_b__foobar')
+
+
+class FieldLookupResolutionTestCase(TestCase):
+    def test_resolve_without_choices(self):
+        catalog = FieldCatalog(ModelC)
+        field = catalog.get_model_field('modelb__modela__model_d__chars')
+        self.assertEqual(field.model.__name__, 'ModelD')
+        self.assertEqual(catalog.get_label('modelb__modela__model_d__chars'), 'modelb . modela . model d . chars')
+        self.assertIsNone(catalog._choices)
+
+    def test_resolve_like_the_full_catalog(self):
+        catalog = FieldCatalog(ModelA)
+        full_catalog = FieldCatalog(ModelA)
+        full_catalog.choices
+        for lookup, model_field in full_catalog.model_fields.items():
+            self.assertEqual(catalog.get_model_field(lookup), model_field)
+            self.assertEqual(catalog.get_label(lookup), full_catalog.labels[lookup])
+        self.assertIsNone(catalog._choices)
+
+    def test_resolve_invalid_lookups(self):
+        catalog = FieldCatalog(ModelA)
+        lookups = [
+            'foobar',                           # Not existing.
+            'model_b__foobar',                  # Not existing on a related model.
+            'model_b__model_c',                 # Relation that could not be null.
+            'model_b__modela__chars',           # Reversion of a relation.
+            'model_b__model_c__modelb__chars',  # Reversion of a relation.
+        ]
+        for lookup in lookups:
+            with self.assertRaises(FieldDoesNotExist):
+                catalog.get_model_field(lookup)
+
+    def test_resolve_respects_max_depth(self):
+        lookup = 'modelb__modela__model_d__chars'
+        with mock.patch.object(ModelTree, 'MAX_DEPTH', 2):
+            with self.assertRaises(FieldDoesNotExist):
+                FieldCatalog(ModelC).get_model_field(lookup)
+
+    def test_bound_form_does_not_build_choices(self):
+        catalog = FieldCatalog(ModelA)
+        data = {
+            f'{add_prefix(0)}-field': 'model_b__integer',
+            f'{add_prefix(0)}-operator': 'exact',
+            f'{add_prefix(0)}-value': '123',
+        }
+        with mock.patch('searchkit.utils.get_field_catalog', return_value=catalog):
+            form = SearchkitForm(data, prefix=add_prefix(0))
+            self.assertTrue(form.is_valid())
+        self.assertIsNone(catalog._choices)
+
+
+class FieldCatalogFileTestCase(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'catalog.json')
+
+    def tearDown(self):
+        load_field_catalog_file()
+        clear_field_catalogs()
+        self.tmpdir.cleanup()
+
+    def dump_and_load(self):
+        with override_settings(SEARCHKIT_FIELD_CATALOG_FILE=self.path):
+            with silence_stdout():
+                call_command('searchkit_catalog')
+            load_field_catalog_file()
+        clear_field_catalogs()
+
+    def test_load_catalog_file(self):
+        live_catalog = get_field_catalog(ModelA)
+        live_operators = [FieldPlan(ModelA).get_operator_choices(l) for l in live_catalog.model_fields]
+        self.dump_and_load()
+        catalog = get_field_catalog(ModelA)
+        self.assertIsNot(catalog, live_catalog)
+        self.assertEqual(catalog.choices, live_catalog.choices)
+        self.assertEqual(catalog.model_fields, live_catalog.model_fields)
+
+        # Operator choices are loaded for all field lookups.
+        self.assertEqual(list(catalog.operator_choices), list(live_catalog.model_fields))
+        operators = [FieldPlan(ModelA).get_operator_choices(l) for l in catalog.model_fields]
+        self.assertEqual(operators, live_operators)
+
+    def test_outdated_catalog_file(self):
+        self.dump_and_load()
+        with open(self.path) as file:
+            data = json.load(file)
+        data['schema_hash'] = 'outdated'
+        data['catalogs']['en-us']['example.modela']['choices'] = []
+        with open(self.path, 'w') as file:
+            json.dump(data, file)
+
+        with override_settings(SEARCHKIT_FIELD_CATALOG_FILE=self.path):
+            load_field_catalog_file()
+        with self.assertLogs('searchkit.utils', level='WARNING'):
+            catalog = get_field_catalog(ModelA)
+        self.assertTrue(catalog.choices)
+
+    def test_missing_catalog_file(self):
+        with override_settings(SEARCHKIT_FIELD_CATALOG_FILE=self.path):
+            with self.assertLogs('searchkit.utils', level='WARNING'):
+                load_field_catalog_file()
+        self.assertTrue(get_field_catalog(ModelA).choices)
+
+
+class SearchSchemaTestCase(TestCase):
+    def get_lookups(self, **schema):
+        attrs = {f'searchkit_{k}': v for k, v in schema.items()}
+        with mock.patch.multiple(ModelAAdmin, create=True, **attrs):
+            catalog = FieldCatalog(ModelA)
+            lookups = [c[0] for g in catalog.choices for c in g[1]]
+
+            # Lookups are validated the same way by a fresh catalog.
+            for lookup in get_field_catalog(ModelA).model_fields:
+                if lookup in lookups:
+                    FieldCatalog(ModelA).get_model_field(lookup)
+                else:
+                    with self.assertRaises(FieldDoesNotExist):
+                        FieldCatalog(ModelA).get_model_field(lookup)
+        return lookups
+
+    def test_default_schema(self):
+        lookups = self.get_lookups(max_depth=ModelTree.MAX_DEPTH)
+        self.assertIn('model_b__model_c__chars', lookups)
+        self.assertIn('model_d__chars', lookups)
+
+    def test_max_depth(self):
+        lookups = self.get_lookups(max_depth=1)
+        self.assertIn('chars', lookups)
+        self.assertIn('model_b__chars', lookups)
+        self.assertNotIn('model_b__model_c__chars', lookups)
+
+    def test_relations(self):
+        lookups = self.get_lookups(relations=['model_b'])
+        self.assertIn('chars', lookups)
+        self.assertIn('model_b__chars', lookups)
+        self.assertNotIn('model_b__model_c__chars', lookups)
+        self.assertNotIn('model_d__chars', lookups)
+
+    def test_exclude_relations(self):
+        lookups = self.get_lookups(exclude_relations=['model_b__model_c', 'model_d'])
+        self.assertIn('model_b__chars', lookups)
+        self.assertNotIn('model_b__model_c__chars', lookups)
+        self.assertNotIn('model_d__chars', lookups)
+
+    def test_fields(self):
+        lookups = self.get_lookups(fields=['chars', 'model_b__model_c__chars'])
+        self.assertEqual(lookups, ['chars', 'model_b__model_c__chars'])
+
+    def test_exclude_fields(self):
+        lookups = self.get_lookups(exclude_fields=['text', 'model_b__chars'])
+        self.assertIn('chars', lookups)
+        self.assertNotIn('text', lookups)
+        self.assertNotIn('model_b__chars', lookups)
+
+    def test_max_fields(self):
+        with self.assertLogs('searchkit.utils', level='WARNING'):
+            lookups = self.get_lookups(max_fields=5)
+        self.assertEqual(len(lookups), 5)
+
+        # No warning if no field was left out.
+        with mock.patch('searchkit.utils.logger') as logger:
+            lookups = self.get_lookups(fields=['chars', 'text'], max_fields=2)
+        self.assertEqual(lookups, ['chars', 'text'])
+        self.assertFalse(logger.warning.called)
+
+    def test_form_validation(self):
+        data = {
+            f'{add_prefix(0)}-field': 'model_b__integer',
+            f'{add_prefix(0)}-operator': 'exact',
+            f'{add_prefix(0)}-value': '123',
+        }
+        with mock.patch.object(ModelAAdmin, 'searchkit_max_depth', 0, create=True):
+            with mock.patch('searchkit.utils.get_field_catalog', return_value=FieldCatalog(ModelA)):
+                form = SearchkitForm(data, prefix=add_prefix(0))
+                self.assertFalse(form.is_valid())
+
+
 class SearchkitFormTestCase(CheckFormMixin, TestCase):
 
     def test_blank_searchkitform(self):
@@ -349,6 +604,129 @@ class SearchkitFormSetTestCase(CreateTestDataMixin, CheckFormMixin, TestCase):
             self.check_form(form)
 
 
+    def test_shared_field_plan(self):
+        formset_class = searchkit_formset_factory(model=ModelA, extra=0)
+        formset = formset_class(initial=INITIAL_DATA)
+        for form in formset.forms:
+            self.assertIs(form.field_plan, formset.field_plan)
+            # The field lookup choices are taken lazily from the shared plan.
+            self.assertIs(form.fields['field'].field_plan, formset.field_plan)
+            lookups = [c[0] for g in form.fields['field'].choices for c in g[1]]
+            self.assertEqual(lookups, list(get_field_catalog(ModelA).model_fields))
+
+
+    def test_unprefixed_data(self):
+        initial_data = [dict(field='integer', operator='exact', value=i) for i in range(12)]
+        formset = SearchkitFormSet(get_form_data(initial_data))
+        self.assertTrue(formset.is_valid())
+        self.assertEqual(len(formset.forms), 12)
+        for i, form in enumerate(formset.forms):
+            self.assertEqual(form.unprefixed_data, dict(field='integer', operator='exact', value=i))
+            self.assertEqual(form.cleaned_data['value'], i)
+
+    def test_get_single_form(self):
+        initial_data = [dict(field='integer', operator='exact', value=i) for i in range(3)]
+        formset = SearchkitFormSet(get_form_data(initial_data))
+        form = formset.get_form(2)
+        self.assertEqual(form.prefix, formset.forms[2].prefix)
+        self.assertTrue(form.is_valid())
+        self.assertTrue(formset.is_valid())
+        self.assertEqual(form.cleaned_data, formset.forms[2].cleaned_data)
+        for index in [-1, 3]:
+            with self.assertRaises(IndexError):
+                formset.get_form(index)
+
+    def test_unprefixed_data_of_single_form(self):
+        # Forms not being part of a formset find their data on their own. Form
+        # 1 should not pick up data of form 10.
+        data = get_form_data([dict(field='integer', operator='exact', value=i) for i in range(11)])
+        data[f'{add_prefix(10)}-foo'] = 'bar'
+        form = SearchkitForm(data, prefix=add_prefix(1))
+        self.assertEqual(form.unprefixed_data, dict(field='integer', operator='exact', value=1))
+
+
+class Select2FieldTestCase(CreateTestDataMixin, TestCase):
+    def get_form(self, field, operator, value):
+        data = QueryDict(mutable=True)
+        data.update({f'{add_prefix(0)}-field': field, f'{add_prefix(0)}-operator': operator})
+        data.setlist(f'{add_prefix(0)}-value', value if isinstance(value, list) else [value])
+        return SearchkitForm(data, prefix=add_prefix(0))
+
+    def test_valid_value(self):
+        form = self.get_form('chars', 'exact', 'ModelA chars 1')
+        # Only a single query for the value should be made.
+        with self.assertNumQueries(1):
+            self.assertTrue(form.is_valid())
+
+    def test_invalid_value(self):
+        form = self.get_form('chars', 'exact', 'foobar')
+        self.assertFalse(form.is_valid())
+        self.assertIn('value', form.errors)
+
+    def test_valid_values(self):
+        form = self.get_form('chars', 'in', ['ModelA chars 1', 'ModelA chars 2', 'ModelA chars 3'])
+        with self.assertNumQueries(1):
+            self.assertTrue(form.is_valid())
+
+    def test_invalid_values(self):
+        form = self.get_form('chars', 'in', ['ModelA chars 1', 'foobar'])
+        self.assertFalse(form.is_valid())
+        self.assertIn('value', form.errors)
+
+    def test_uuid_values(self):
+        form = self.get_form('uuid', 'exact', str(ModelA.objects.first().uuid))
+        self.assertTrue(form.is_valid())
+        form = self.get_form('uuid', 'exact', 'no-uuid')
+        with self.assertNumQueries(0):
+            self.assertFalse(form.is_valid())
+
+
+class ValueChoicesTestCase(CreateTestDataMixin, TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.field_plan = FieldPlan(ModelA)
+
+    def test_declared_choices(self):
+        with self.assertNumQueries(0):
+            form_field = self.field_plan.get_form_field('chars_choices', 'exact')
+            self.assertIs(type(form_field), forms.ChoiceField)
+            form_field = self.field_plan.get_form_field('chars_choices', 'in')
+            self.assertIs(type(form_field), forms.MultipleChoiceField)
+        self.assertEqual(list(form_field.choices), list(ModelA._meta.get_field('chars_choices').choices))
+
+    def test_many_values(self):
+        self.assertIsInstance(self.field_plan.get_form_field('chars', 'exact'), Select2Field)
+        self.assertIsInstance(self.field_plan.get_form_field('chars', 'in'), MultiSelect2Field)
+
+        # Changes of the data do not bring back the probe for the values.
+        ModelA.objects.first().save()
+        with self.assertNumQueries(0):
+            self.assertIsInstance(self.field_plan.get_form_field('chars', 'exact'), Select2Field)
+
+    @override_settings(SEARCHKIT_MAX_INLINE_CHOICES=2000)
+    def test_few_values(self):
+        values = ModelA.objects.order_by('chars').values_list('chars', flat=True).distinct()
+        form_field = self.field_plan.get_form_field('chars', 'exact')
+        self.assertIs(type(form_field), forms.ChoiceField)
+        self.assertEqual([c[0] for c in form_field.choices], list(values))
+
+        # The values are cached.
+        with self.assertNumQueries(0):
+            form_field = self.field_plan.get_form_field('chars', 'in')
+        self.assertIs(type(form_field), forms.MultipleChoiceField)
+
+        # Until the data changes.
+        obj = ModelA.objects.first()
+        obj.chars = 'new value'
+        obj.save()
+        form_field = self.field_plan.get_form_field('chars', 'exact')
+        self.assertIn(('new value', 'new value'), form_field.choices)
+
+    @override_settings(SEARCHKIT_MAX_INLINE_CHOICES=2000, SEARCHKIT_CACHE=None)
+    def test_few_values_without_cache(self):
+        self.assertIsInstance(self.field_plan.get_form_field('chars', 'exact'), Select2Field)
+
+
 class SearchkitSearchFormTestCase(CreateTestDataMixin, TestCase):
     def setUp(self):
         self.data = get_form_data()
@@ -403,6 +781,32 @@ class SearchkitModelFormTestCase(TestCase):
         self.assertEqual('example | model c', labels[3].lower())
 
 
+class SearchableModelsTestCase(TestCase):
+    def tearDown(self):
+        clear_searchable_models()
+
+    def test_searchable_models(self):
+        self.assertEqual(get_searchable_models(), (ModelA, ModelB, ModelC))
+        ids = [ContentType.objects.get_for_model(m).id for m in (ModelA, ModelB, ModelC)]
+        self.assertEqual(get_searchable_contenttype_ids(), tuple(ids))
+
+        # Content type ids are only queried once.
+        with self.assertNumQueries(0):
+            get_searchable_contenttype_ids()
+
+    def test_searchkit_filter_subclass(self):
+        class CustomSearchkitFilter(SearchkitFilter):
+            pass
+
+        clear_searchable_models()
+        with mock.patch.object(ModelCAdmin, 'list_filter', [CustomSearchkitFilter]):
+            self.assertEqual(get_searchable_models(), (ModelA, ModelB, ModelC))
+
+        clear_searchable_models()
+        with mock.patch.object(ModelCAdmin, 'list_filter', []):
+            self.assertEqual(get_searchable_models(), (ModelA, ModelB))
+
+
 class AdminBackendTest(CreateTestDataMixin, TestCase):
 
     def setUp(self):
@@ -420,6 +824,14 @@ class AdminBackendTest(CreateTestDataMixin, TestCase):
         for snippet in select.split(' '):
             self.assertIn(snippet, str(resp.content))
 
+    def test_searchable_model_filter(self):
+        url = reverse('admin:searchkit_search_changelist')
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        for model in (ModelA, ModelB, ModelC):
+            contenttype = ContentType.objects.get_for_model(model)
+            self.assertIn(f'?contenttype__id__exact={contenttype.id}', resp.content.decode('utf-8'))
+
     def test_search_form_with_initial(self):
         url = reverse('admin:searchkit_search_add') + f'?searchkit_model={self.modela_ct.id}'
         resp = self.client.get(url)
@@ -497,6 +909,57 @@ class AdminBackendTest(CreateTestDataMixin, TestCase):
         self.assertNotIn("No valid search data provided.", str(resp.content))
         self.assertEqual(len(Search.objects.all()), 0)
 
+    def test_explain_search(self):
+        url = reverse('admin:searchkit_search_add')
+        resp = self.client.get(url)
+        self.assertContains(resp, 'name="_explain"')
+        self.assertContains(resp, 'name="_explain_analyze"')
+
+        data = self.data.copy()
+        data['_explain'] = True
+        resp = self.client.post(url, data)
+        self.assertEqual(resp.status_code, 200)
+        self.assertTemplateUsed(resp, 'admin/searchkit/search/explain.html')
+        self.assertTrue(resp.context['plan'])
+        self.assertNotIn('error', resp.context)
+        self.assertEqual(len(Search.objects.all()), 0)
+        self.assertFalse(LogEntry.objects.exists())
+
+        # Full table scans are found in the plans of all sqlite versions.
+        for plan in ['SCAN example_modela', 'SCAN TABLE example_modela', 'Seq Scan on example_modela']:
+            self.assertEqual([t for p in FULL_SCAN_PATTERNS for t in p.findall(plan)], ['example_modela'])
+
+        # Sqlite does not support the analyze option.
+        data = self.data.copy()
+        data['_explain_analyze'] = True
+        resp = self.client.post(url, data)
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn('error', resp.context)
+        self.assertEqual(len(Search.objects.all()), 0)
+
+    def test_explain_search_analyze_permission(self):
+        user = User.objects.create_user(username='staff', password='staff', is_staff=True)
+        user.user_permissions.add(Permission.objects.get(codename='add_search'))
+        self.client.force_login(user)
+        url = reverse('admin:searchkit_search_add')
+        resp = self.client.get(url)
+        self.assertContains(resp, 'name="_explain"')
+        self.assertNotContains(resp, 'name="_explain_analyze"')
+
+        data = self.data.copy()
+        data['_explain_analyze'] = True
+        resp = self.client.post(url, data)
+        self.assertEqual(resp.status_code, 403)
+
+        # Explaining needs the permission to view the searched model.
+        data = self.data.copy()
+        data['_explain'] = True
+        resp = self.client.post(url, data)
+        self.assertEqual(resp.status_code, 403)
+        user.user_permissions.add(Permission.objects.get(codename='view_modela'))
+        resp = self.client.post(url, data)
+        self.assertEqual(resp.status_code, 200)
+
     def test_apply_saved_search(self):
         # Create a search object via the admin backend.
         url = reverse('admin:searchkit_search_add')
@@ -601,6 +1064,154 @@ class SearchkitViewTest(CreateTestDataMixin, TestCase):
         self.assertEqual(resp.status_code, 400)
 
 
+    def test_searchkit_view_with_single_form(self):
+        initial = self.initial + self.initial_range
+        data = get_form_data(initial)
+        data['sk_reload_form'] = 1
+        url = f"{reverse('searchkit-reload')}?{urlencode(data)}"
+        with mock.patch.object(BaseSearchkitFormSet, 'forms', new_callable=mock.PropertyMock) as forms:
+            resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        # Only the fieldsets of the second form are rendered.
+        self.assertFalse(forms.called)
+        html = resp.content.decode('utf-8')
+        self.assertEqual(html.count('<fieldset'), 2)
+        self.assertIn('data-prefix="searchkit-example-modela-1"', html)
+        self.assertNotIn('searchkit-example-modela-0-', html)
+        self.assertNotIn('searchkit_formset', html)
+        input = '<input type="number" name="searchkit-example-modela-1-value_1" value="3" id="id_searchkit-example-modela-1-value_1">'
+        self.assertInHTML(input, html)
+
+    def test_searchkit_view_with_shared_field_options(self):
+        initial = self.initial + self.initial_range
+        data = get_form_data(initial)
+        url = f"{reverse('searchkit-reload')}?{urlencode(data)}"
+        resp = self.client.get(url)
+        html = resp.content.decode('utf-8')
+
+        # All field lookups are rendered once.
+        for lookup in [c[0] for g in FieldPlan(ModelA).get_field_lookup_choices() for c in g[1]]:
+            if lookup != 'integer':
+                self.assertEqual(html.count(f'<option value="{lookup}"'), 1)
+        self.assertEqual(html.count('<template id="searchkit_field_options">'), 1)
+
+        # Each field lookup select renders its selected option only.
+        select = '<select name="searchkit-example-modela-1-field" class="searchkit-reload" data-reload-handler="change" id="id_searchkit-example-modela-1-field"><option value="integer" selected>integer</option></select>'
+        self.assertInHTML(select, html)
+        self.assertEqual(html.count('<option value="integer"'), 3)
+
+        # Field lookups of the model itself are not wrapped by an optgroup.
+        self.assertNotIn('<optgroup label="None">', html)
+
+        # Without a value the first field lookup is selected.
+        field_plan = FieldPlan(ModelA)
+        first = field_plan.get_field_lookup_choices()[0][1][0]
+        html = FieldLookupSelect(field_plan).render('field', None)
+        self.assertInHTML(f'<select name="field"><option value="{first[0]}" selected>{first[1]}</option></select>', html)
+
+    def test_searchkit_view_with_etag(self):
+        get_cache().clear()
+        data = get_form_data(self.initial)
+        url = f"{reverse('searchkit-reload')}?{urlencode(data)}"
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn('no-cache', resp['Cache-Control'])
+        etag = resp['ETag']
+
+        # Unchanged requests are answered without building the formset.
+        with mock.patch('searchkit.views.searchkit_formset_factory') as factory:
+            resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+        self.assertFalse(factory.called)
+
+        # Other parameters or changed data give another etag.
+        data['sk_reload_form'] = 0
+        resp = self.client.get(f"{reverse('searchkit-reload')}?{urlencode(data)}", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        ModelA.objects.first().save()
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+
+        # No field plan is built for models which are not searchable.
+        data['searchkit_model'] = ContentType.objects.get_for_model(User).pk
+        with mock.patch('searchkit.views.FieldPlan') as field_plan:
+            resp = self.client.get(f"{reverse('searchkit-reload')}?{urlencode(data)}")
+        self.assertEqual(resp.status_code, 400)
+        self.assertFalse(field_plan.called)
+
+    def test_searchkit_view_with_data_dependent_choices(self):
+        # Clients may only keep fragments which do not depend on the data.
+        for rule, memoize in [(dict(field='integer', operator='exact', value=1), '1'),
+                              (dict(field='chars', operator='exact', value='x'), '0')]:
+            url = f"{reverse('searchkit-reload')}?{urlencode(get_form_data([rule]))}"
+            resp = self.client.get(url)
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(resp['X-Searchkit-Memoize'], memoize)
+
+    def test_searchkit_view_with_invalid_form_index(self):
+        data = get_form_data(self.initial)
+        for index in ['foo', '-1', str(len(self.initial)), '1000']:
+            data['sk_reload_form'] = index
+            url = f"{reverse('searchkit-reload')}?{urlencode(data)}"
+            resp = self.client.get(url)
+            self.assertEqual(resp.status_code, 400)
+
+
+class CatalogViewTest(CreateTestDataMixin, TestCase):
+    def setUp(self):
+        admin = User.objects.get(username='admin')
+        self.client.force_login(admin)
+        model = ContentType.objects.get_for_model(ModelA).pk
+        self.url = f"{reverse('searchkit-catalog')}?{urlencode(dict(searchkit_model=model))}"
+
+    def test_catalog_view(self):
+        resp = self.client.get(self.url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn('private', resp['Cache-Control'])
+        self.assertIn('no-cache', resp['Cache-Control'])
+        catalog = json.loads(resp.content)
+        field_plan = FieldPlan(ModelA)
+        lookups = [c[0] for g in field_plan.get_field_lookup_choices() for c in g[1]]
+        self.assertEqual([c[0] for g in catalog['fields'] for c in g[1]], lookups)
+        self.assertEqual(list(catalog['operators']), lookups)
+        self.assertEqual(list(catalog['values']), lookups)
+
+        # Widgets are deduplicated and use a placeholder for the prefix.
+        self.assertEqual(len(catalog['widgets']), len(set(catalog['widgets'])))
+        widget = catalog['widgets'][catalog['values']['integer']['exact']]
+        self.assertIn('name="__prefix__-value"', widget)
+        self.assertEqual(catalog['values']['chars']['iexact'], catalog['values']['email']['iexact'])
+
+        # Widgets depending on the data are loaded from the server.
+        self.assertIsNone(catalog['values']['chars']['exact'])
+        self.assertIsNotNone(catalog['values']['chars_choices']['exact'])
+
+    def test_catalog_view_with_etag(self):
+        resp = self.client.get(self.url)
+        etag = resp['ETag']
+        resp = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+        with translation.override('de'):
+            resp = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag, HTTP_ACCEPT_LANGUAGE='de')
+        self.assertEqual(resp.status_code, 200)
+        with mock.patch('searchkit.views.get_schema_hash', return_value='changed'):
+            resp = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+
+    def test_catalog_view_with_invalid_model(self):
+        resp = self.client.get(f"{reverse('searchkit-catalog')}?searchkit_model=9999")
+        self.assertEqual(resp.status_code, 400)
+        self.client.logout()
+        resp = self.client.get(self.url)
+        self.assertEqual(resp.status_code, 403)
+
+    def test_client_catalog_is_cached(self):
+        self.assertIs(FieldPlan(ModelA).get_client_catalog(), FieldPlan(ModelA).get_client_catalog())
+
+
+# The value index is built in a background thread which would not see the data
+# of our test transactions.
+@override_settings(SEARCHKIT_INDEX_MAX_VALUES=0)
 class Select2ViewTestCase(CreateTestDataMixin, TestCase):
     def setUp(self):
         admin = User.objects.get(username='admin')
@@ -611,6 +1222,7 @@ class Select2ViewTestCase(CreateTestDataMixin, TestCase):
             'sk_autocomplete_model_name': ModelA._meta.model_name,
             'sk_autocomplete_field_name': 'chars',
         }
+        get_cache().clear()
 
     def test_select2_view_with_anonymous_user(self):
         self.client.logout()
@@ -645,6 +1257,56 @@ class Select2ViewTestCase(CreateTestDataMixin, TestCase):
         self.assertTrue('results' in result)
         self.assertEqual(len(result['results']), AutocompleteView.paginate_by)
 
+    def test_select2_view_with_cursor(self):
+        values = []
+        data = self.data.copy()
+        with CaptureQueriesContext(connection) as queries:
+            while True:
+                resp = self.client.get(f'{self.url}?{urlencode(data)}')
+                self.assertEqual(resp.status_code, 200)
+                result = json.loads(resp.content)
+                values.extend(r['id'] for r in result['results'])
+                if not result['pagination']['more']:
+                    self.assertIsNone(result['pagination']['cursor'])
+                    break
+                data['cursor'] = result['pagination']['cursor']
+
+        # We got all values without any count query.
+        queryset = ModelA.objects.order_by('chars').values_list('chars', flat=True).distinct()
+        self.assertEqual(values, list(queryset))
+        self.assertFalse(any('COUNT(' in q['sql'] for q in queries.captured_queries))
+
+    def test_select2_view_with_invalid_cursor(self):
+        encode = lambda cursor: urlsafe_base64_encode(json.dumps(cursor).encode('utf-8'))
+        cursors = [
+            'invalid',
+            encode(['foo']),
+            encode(dict(value=1)),
+            encode(dict(value='foo', phase='foo')),
+            encode(dict(value='foo', count='foo')),
+        ]
+        for cursor in cursors:
+            data = dict(self.data, cursor=cursor, term='Model')
+            resp = self.client.get(f'{self.url}?{urlencode(data)}')
+            self.assertEqual(resp.status_code, 400)
+
+    def test_select2_view_with_invalid_page(self):
+        data = dict(self.data, page='foo')
+        resp = self.client.get(f'{self.url}?{urlencode(data)}')
+        self.assertEqual(resp.status_code, 400)
+
+    def get_all_results(self, data):
+        values = []
+        while True:
+            resp = self.client.get(f'{self.url}?{urlencode(data)}')
+            self.assertEqual(resp.status_code, 200)
+            result = json.loads(resp.content)
+            values.extend(r['id'] for r in result['results'])
+            if not result['pagination']['more']:
+                self.assertIsNone(result['pagination']['cursor'])
+                return values
+            data = dict(data, cursor=result['pagination']['cursor'])
+
     def test_select2_view_with_search_term(self):
         data = self.data.copy()
         data['term'] = 'Model'
@@ -653,15 +1315,485 @@ class Select2ViewTestCase(CreateTestDataMixin, TestCase):
         self.assertEqual(resp.status_code, 200)
         result = json.loads(resp.content)
         self.assertTrue('pagination' in result)
-        self.assertFalse(result['pagination']['more'])
+        self.assertTrue(result['pagination']['more'])
         self.assertTrue('results' in result)
+        self.assertEqual(len(result['results']), AutocompleteView.paginate_by)
+
+        # We get max_results values at most.
         field_name = self.data['sk_autocomplete_field_name']
         lookup = f'{field_name}__icontains'
-        queryset = ModelA.objects.order_by(lookup)
-        queryset = queryset.values_list(field_name)
+        queryset = ModelA.objects.order_by(field_name)
+        queryset = queryset.values_list(field_name, flat=True)
         queryset = queryset.filter(**{lookup:data['term']})
         queryset = queryset.distinct()
-        self.assertEqual(len(result['results']), queryset.count())
+        values = self.get_all_results(data)
+        self.assertEqual(values, list(queryset[:AutocompleteView.max_results]))
+
+    def test_select2_view_with_ranked_search_term(self):
+        # Values starting with the term come first.
+        data = self.data.copy()
+        data['term'] = '1'
+        field_name = self.data['sk_autocomplete_field_name']
+        ModelA.objects.filter(pk=ModelA.objects.last().pk).update(**{field_name: '1 starts with one'})
+        invalidate_data_version(ModelA)
+        queryset = ModelA.objects.order_by(field_name).values_list(field_name, flat=True).distinct()
+        prefix = list(queryset.filter(**{f'{field_name}__istartswith': '1'}))
+        contains = list(queryset.filter(**{f'{field_name}__icontains': '1'}).exclude(**{f'{field_name}__istartswith': '1'}))
+        values = self.get_all_results(data)
+        self.assertEqual(prefix, ['1 starts with one'])
+        self.assertEqual(values, (prefix + contains)[:AutocompleteView.max_results])
+
+    def test_select2_view_with_limited_search_term(self):
+        data = self.data.copy()
+        data['term'] = 'Model'
+        with mock.patch.multiple(AutocompleteView, max_results=30, max_response_size=100):
+            values = self.get_all_results(data)
+            self.assertEqual(len(values), 30)
+
+            # The response size limits the values of a page.
+            resp = self.client.get(f'{self.url}?{urlencode(data)}')
+            result = json.loads(resp.content)
+            self.assertLess(len(result['results']), AutocompleteView.paginate_by)
+            self.assertTrue(result['pagination']['more'])
+
+
+    def test_select2_view_is_cached(self):
+        url = f'{self.url}?{urlencode(self.data)}'
+        result = json.loads(self.client.get(url).content)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(json.loads(self.client.get(url).content), result)
+        self.assertFalse(any('example_modela' in q['sql'] for q in queries.captured_queries))
+
+        # Saving an object invalidates the cache.
+        obj = ModelA.objects.order_by('chars').first()
+        obj.chars = '0 first value'
+        obj.save()
+        result = json.loads(self.client.get(url).content)
+        self.assertEqual(result['results'][0]['id'], '0 first value')
+
+        # So does deleting it.
+        obj.delete()
+        result = json.loads(self.client.get(url).content)
+        self.assertNotEqual(result['results'][0]['id'], '0 first value')
+
+    def test_select2_view_without_cache(self):
+        url = f'{self.url}?{urlencode(self.data)}'
+        with override_settings(SEARCHKIT_CACHE=None):
+            self.assertIsNone(get_cache())
+            self.client.get(url)
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(url)
+            self.assertTrue(any('example_modela' in q['sql'] for q in queries.captured_queries))
+
+    def test_select2_view_with_etag(self):
+        url = f'{self.url}?{urlencode(self.data)}'
+        resp = self.client.get(url)
+        self.assertIn('no-cache', resp['Cache-Control'])
+        etag = resp['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+        self.assertFalse(any('example_modela' in q['sql'] for q in queries.captured_queries))
+
+        # Changing the data of the model changes the etag.
+        ModelA.objects.first().save()
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+
+        # Without a cache there are no data versions and no etags.
+        with override_settings(SEARCHKIT_CACHE=None):
+            resp = self.client.get(url)
+            self.assertFalse(resp.has_header('ETag'))
+
+    def test_cache_key(self):
+        key = get_cache_key('autocomplete', ModelA, 'chars', 'term')
+        self.assertEqual(key, get_cache_key('autocomplete', ModelA, 'chars', 'term'))
+        self.assertNotEqual(key, get_cache_key('autocomplete', ModelA, 'chars', 'other'))
+        self.assertNotEqual(key, get_cache_key('autocomplete', ModelB, 'chars', 'term'))
+        invalidate_data_version(ModelA)
+        self.assertNotEqual(key, get_cache_key('autocomplete', ModelA, 'chars', 'term'))
+
+    def test_invalidate_searched_models_only(self):
+        with mock.patch('searchkit.cache.invalidate_data_version') as invalidate:
+            User.objects.create_user(username='someone')
+            invalidate.assert_not_called()
+
+            # Related models of searchable models are searched too.
+            ModelD.objects.first().save()
+            invalidate.assert_called_with(ModelD)
+
+
+class ValueIndexTestCase(CreateTestDataMixin, TestCase):
+    def setUp(self):
+        get_cache().clear()
+        clear_value_indexes()
+        self.field = ModelA._meta.get_field('chars')
+        self.queryset = ModelA.objects.order_by('chars').values_list('chars', flat=True).distinct()
+
+    def test_value_index(self):
+        index = ValueIndex(['Bar', 'foo', 'Foobar', 'barfoo', 'xfoox', 'fo'])
+        self.assertEqual(index.get_values(None), ['Bar', 'Foobar', 'barfoo', 'fo', 'foo', 'xfoox'])
+        self.assertEqual(index.get_values(None, after='Foobar', limit=2), ['barfoo', 'fo'])
+        self.assertEqual(index.get_values(None, limit=2, offset=1), ['Foobar', 'barfoo'])
+        self.assertEqual(index.get_values('prefix', 'FOO'), ['Foobar', 'foo'])
+        self.assertEqual(index.get_values('prefix', 'foo', after='Foobar'), ['foo'])
+        self.assertEqual(index.get_values('contains', 'foo'), ['barfoo', 'xfoox'])
+        self.assertEqual(index.get_values('contains', 'fo', limit=1), ['barfoo'])
+        self.assertEqual(index.get_values('contains', 'oob'), ['Foobar'])
+        self.assertEqual(index.get_values('contains', 'zzz'), [])
+
+    def test_value_index_matches_database(self):
+        index = ValueIndex(self.queryset)
+        for term in ['Model', 'chars 1', '99', 'x']:
+            prefix = self.queryset.filter(chars__istartswith=term)
+            contains = self.queryset.filter(chars__icontains=term).exclude(chars__istartswith=term)
+            self.assertEqual(index.get_values('prefix', term), list(prefix))
+            self.assertEqual(index.get_values('contains', term), list(contains))
+
+    def test_get_value_index(self):
+        with mock.patch('searchkit.index._build_in_background', side_effect=build_value_index) as build:
+            # The first call starts building the index.
+            self.assertIsNone(get_value_index(self.queryset, self.field))
+            index = get_value_index(self.queryset, self.field)
+            self.assertEqual(len(index), self.queryset.count())
+            self.assertEqual(build.call_count, 1)
+
+            # A change of the data outdates the index.
+            ModelA.objects.first().save()
+            self.assertIsNone(get_value_index(self.queryset, self.field))
+            self.assertIsNot(get_value_index(self.queryset, self.field), index)
+            self.assertEqual(build.call_count, 2)
+
+            # Not for non character fields or too many values.
+            self.assertIsNone(get_value_index(self.queryset, ModelA._meta.get_field('integer')))
+            with override_settings(SEARCHKIT_INDEX_MAX_VALUES=10):
+                clear_value_indexes()
+                self.assertIsNone(get_value_index(self.queryset, self.field))
+                self.assertIsNone(get_value_index(self.queryset, self.field))
+            self.assertEqual(build.call_count, 3)
+
+    def test_select2_view_with_index(self):
+        admin = User.objects.get(username='admin')
+        self.client.force_login(admin)
+        url = reverse('searchkit-autocomplete')
+        data = {
+            'sk_autocomplete_app_label': ModelA._meta.app_label,
+            'sk_autocomplete_model_name': ModelA._meta.model_name,
+            'sk_autocomplete_field_name': 'chars',
+            'term': '1',
+        }
+        with override_settings(SEARCHKIT_CACHE=None):
+            expected = json.loads(self.client.get(f'{url}?{urlencode(data)}').content)
+        with mock.patch('searchkit.index._build_in_background', side_effect=build_value_index):
+            get_value_index(self.queryset, self.field)
+            with CaptureQueriesContext(connection) as queries:
+                result = json.loads(self.client.get(f'{url}?{urlencode(data)}').content)
+        self.assertEqual(result['results'], expected['results'])
+        self.assertFalse(any('example_modela' in q['sql'] for q in queries.captured_queries))
+
+        # Cursors tell the source which issued them.
+        decode = AutocompleteView().decode_cursor
+        self.assertEqual(decode(result['pagination']['cursor'])['source'], 'index')
+        self.assertEqual(decode(expected['pagination']['cursor'])['source'], 'database')
+
+        # Pages of a cursor issued by the database are not served by the index.
+        data['cursor'] = expected['pagination']['cursor']
+        with override_settings(SEARCHKIT_CACHE=None):
+            expected = json.loads(self.client.get(f'{url}?{urlencode(data)}').content)
+        with mock.patch.object(ValueIndex, 'get_values') as get_values:
+            result = json.loads(self.client.get(f'{url}?{urlencode(data)}').content)
+        get_values.assert_not_called()
+        self.assertEqual(result, expected)
+
+    def test_select2_view_with_outdated_index(self):
+        admin = User.objects.get(username='admin')
+        self.client.force_login(admin)
+        url = reverse('searchkit-autocomplete')
+        data = {
+            'sk_autocomplete_app_label': ModelA._meta.app_label,
+            'sk_autocomplete_model_name': ModelA._meta.model_name,
+            'sk_autocomplete_field_name': 'chars',
+        }
+        with mock.patch('searchkit.index._build_in_background', side_effect=build_value_index):
+            get_value_index(self.queryset, self.field)
+        result = json.loads(self.client.get(f'{url}?{urlencode(data)}').content)
+        data['cursor'] = result['pagination']['cursor']
+
+        # Processes without the index build it to serve the next page.
+        clear_value_indexes()
+        resp = self.client.get(f'{url}?{urlencode(data)}')
+        self.assertEqual(resp.status_code, 200)
+
+        # Cursors of an outdated index are rejected instead of being served
+        # by the database.
+        ModelA.objects.first().save()
+        resp = self.client.get(f'{url}?{urlencode(data)}')
+        self.assertEqual(resp.status_code, 409)
+
+    def test_value_index_budget(self):
+        field = ModelD._meta.get_field('chars')
+        queryset = ModelD.objects.order_by('chars').values_list('chars', flat=True).distinct()
+        with override_settings(SEARCHKIT_INDEX_MAX_TOTAL_VALUES=self.queryset.count()):
+            index = get_value_index(self.queryset, self.field, wait=True)
+            self.assertIsNotNone(index)
+            # The least recently used index is dropped for a new one.
+            self.assertIsNotNone(get_value_index(queryset, field, wait=True))
+            self.assertIsNot(get_value_index(self.queryset, self.field, wait=True), index)
+
+        # Fields with too many values are tried again after a while.
+        with override_settings(SEARCHKIT_INDEX_MAX_VALUES=10):
+            clear_value_indexes()
+            self.assertIsNone(get_value_index(self.queryset, self.field, wait=True))
+        with mock.patch('searchkit.index.time.monotonic', return_value=time.monotonic() + 3600):
+            self.assertIsNotNone(get_value_index(self.queryset, self.field, wait=True))
+
+
+class RuleOptimizerTestCase(CreateTestDataMixin, TestCase):
+    RULES = [
+        # Or-ed equalities.
+        [
+            dict(field='integer_choices', operator='exact', value=1),
+            dict(field='integer_choices', operator='exact', value=2, logical_operator='or'),
+            dict(field='integer_choices', operator='in', value=[2, 3], logical_operator='or'),
+        ],
+        [
+            dict(field='chars', operator='exact', value='ModelA chars 1'),
+            dict(field='chars', operator='exact', value='ModelA chars 2', logical_operator='or'),
+        ],
+        [
+            dict(field='model_d__integer', operator='exact', value=1),
+            dict(field='model_d__integer', operator='exact', value=2, logical_operator='or'),
+        ],
+        # And-ed bounds.
+        [
+            dict(field='integer', operator='lte', value=500),
+            dict(field='integer', operator='gte', value=100),
+        ],
+        # Duplicate and contradictory rules.
+        [
+            dict(field='integer_choices', operator='in', value=[1, 2]),
+            dict(field='integer_choices', operator='in', value=[1, 2]),
+            dict(field='integer_choices', operator='exact', value=2),
+        ],
+        [
+            dict(field='integer_choices', operator='exact', value=1),
+            dict(field='integer_choices', operator='exact', value=2),
+            dict(field='integer', operator='lt', value=100, logical_operator='or'),
+        ],
+        [
+            dict(field='integer', operator='lt', value=100),
+            dict(field='integer_choices', operator='exact', value=1, logical_operator='xor'),
+            dict(field='integer_choices', operator='exact', value=1, logical_operator='xor'),
+        ],
+        # Xor-ed exclusive rules.
+        [
+            dict(field='integer_choices', operator='exact', value=1),
+            dict(field='integer_choices', operator='exact', value=2, logical_operator='xor'),
+            dict(field='integer', operator='lt', value=100, logical_operator='xor'),
+        ],
+    ]
+
+    def test_optimize_rules(self):
+        optimized = [optimize_rules(ModelA, rules) for rules in self.RULES]
+        self.assertEqual(optimized[0], [dict(field='integer_choices', operator='in', value=[1, 2, 3])])
+        self.assertEqual(optimized[1], [dict(field='chars', operator='in', value=['ModelA chars 1', 'ModelA chars 2'])])
+        self.assertEqual(optimized[2], [dict(field='model_d__integer', operator='in', value=[1, 2])])
+        self.assertEqual(optimized[3], [dict(field='integer', operator='range', value=[100, 500])])
+        self.assertEqual(optimized[4], [dict(field='integer_choices', operator='exact', value=2)])
+        self.assertEqual(optimized[5][0], dict(field='integer_choices', operator='in', value=[]))
+        # Xor-ed duplicates are only removed if xor is true for an odd number
+        # of true operands.
+        if django.VERSION >= (5, 0):
+            self.assertEqual(optimized[6], self.RULES[6][:1])
+        else:
+            self.assertEqual(optimized[6], self.RULES[6])
+        self.assertEqual(optimized[7][0], dict(field='integer_choices', operator='in', value=[1, 2]))
+
+    def test_rules_which_are_not_optimized(self):
+        rules = [
+            # The or-ed rule is combined with both rules before it.
+            [
+                dict(field='integer', operator='lt', value=100),
+                dict(field='integer_choices', operator='exact', value=1, logical_operator='and'),
+                dict(field='integer_choices', operator='exact', value=2, logical_operator='or'),
+            ],
+            # Bounds over to-many relations are not merged.
+            [
+                dict(field='model_d__integer', operator='gte', value=10),
+                dict(field='model_d__integer', operator='lte', value=20),
+            ],
+            # Strings might be compared case-insensitive by the database.
+            [
+                dict(field='chars', operator='exact', value='a'),
+                dict(field='chars', operator='exact', value='A'),
+            ],
+            # Negated rules.
+            [
+                dict(field='integer_choices', operator='exact', value=1, negation=True),
+                dict(field='integer_choices', operator='exact', value=2, logical_operator='or'),
+            ],
+            # Exact None is an isnull lookup. In lists drop None.
+            [
+                dict(field='boolean', operator='exact', value=None),
+                dict(field='boolean', operator='exact', value=True, logical_operator='or'),
+            ],
+            [
+                dict(field='boolean', operator='in', value=[True, None]),
+                dict(field='boolean', operator='exact', value=False, logical_operator='or'),
+            ],
+            [
+                dict(field='integer', operator='lt', value=100),
+                dict(field='boolean', operator='exact', value=None, logical_operator='xor'),
+                dict(field='boolean', operator='exact', value=None, logical_operator='xor'),
+            ],
+            # Xor-ed duplicates of nullable fields.
+            [
+                dict(field='integer', operator='lt', value=100),
+                dict(field='boolean', operator='exact', value=True, logical_operator='xor'),
+                dict(field='boolean', operator='exact', value=True, logical_operator='xor'),
+            ],
+        ]
+        for data in rules:
+            self.assertEqual(optimize_rules(ModelA, data), data)
+
+    def test_rules_with_null_values(self):
+        contenttype = ContentType.objects.get_for_model(ModelA)
+        data = [
+            dict(field='boolean', operator='exact', value=None),
+            dict(field='boolean', operator='exact', value=True, logical_operator='or'),
+        ]
+        queryset = ModelA.objects.filter(Search(contenttype=contenttype, data=data).as_q())
+        expected = ModelA.objects.filter(Q(boolean__isnull=True) | Q(boolean=True))
+        self.assertTrue(expected.filter(boolean__isnull=True).exists())
+        self.assertEqual(list(queryset.order_by('pk')), list(expected.order_by('pk')))
+
+    def test_results_are_unchanged(self):
+        contenttype = ContentType.objects.get_for_model(ModelA)
+        xor_duplicates = [
+            dict(field='integer', operator='lt', value=100),
+            dict(field='integer_choices', operator='exact', value=1, logical_operator='xor'),
+            dict(field='integer_choices', operator='exact', value=1, logical_operator='xor'),
+            dict(field='boolean', operator='exact', value=True, logical_operator='xor'),
+            dict(field='boolean', operator='exact', value=True, logical_operator='xor'),
+        ]
+        for data in self.RULES + [xor_duplicates]:
+            # Q objects support xor since django 4.2.
+            if django.VERSION < (4, 2) and any(r.get('logical_operator') == 'xor' for r in data):
+                continue
+            search = Search(contenttype=contenttype, data=data)
+            optimized = ModelA.objects.filter(search.as_q())
+            with mock.patch('searchkit.models.optimize_rules', side_effect=lambda model, rules: rules):
+                unoptimized = ModelA.objects.filter(search.as_q())
+            self.assertEqual(list(optimized.order_by('pk')), list(unoptimized.order_by('pk')))
+
+    def test_rewrite_rule(self):
+        rule = lambda operator, value: dict(field='chars', operator=operator, value=value)
+        hints = dict(prefix=True, case='lower')
+        self.assertEqual(rewrite_rule(rule('regex', '^abc'), {}), {'chars__regex': '^abc'})
+        self.assertEqual(rewrite_rule(rule('regex', '^abc'), hints), {'chars__startswith': 'abc'})
+        self.assertEqual(rewrite_rule(rule('regex', r'^a\.c\Z'), hints), {'chars__exact': 'a.c'})
+        # The $ anchor also matches before a trailing newline.
+        self.assertEqual(rewrite_rule(rule('regex', r'^a\.c$'), hints), {'chars__regex': r'^a\.c$'})
+        self.assertEqual(rewrite_rule(rule('iregex', '^ABC'), hints), {'chars__startswith': 'abc'})
+        self.assertEqual(rewrite_rule(rule('regex', r'^a\dc'), hints), {'chars__regex': r'^a\dc'})
+        self.assertEqual(rewrite_rule(rule('regex', '^a$c'), hints), {'chars__regex': '^a$c'})
+        self.assertEqual(rewrite_rule(rule('regex', 'abc'), hints), {'chars__regex': 'abc'})
+        self.assertEqual(rewrite_rule(rule('iexact', 'ABC'), hints), {'chars__exact': 'abc'})
+        self.assertEqual(rewrite_rule(rule('icontains', 'ABC'), dict(case='upper')), {'chars__contains': 'ABC'})
+
+        value = datetime.datetime(2025, 5, 14, 8, 45, tzinfo=datetime.timezone.utc)
+        lookups = rewrite_rule(dict(field='datetime', operator='exact', value=value), dict(precision='minute'))
+        self.assertEqual(lookups, {'datetime__gte': value, 'datetime__lt': value + datetime.timedelta(minutes=1)})
+
+    def test_rewritten_results(self):
+        contenttype = ContentType.objects.get_for_model(ModelA)
+        value = ModelA.objects.order_by('pk').first().datetime
+        hints = {'chars': dict(prefix=True), 'datetime': dict(precision='day')}
+        with mock.patch.object(ModelAAdmin, 'searchkit_field_hints', hints, create=True):
+            search = Search(contenttype=contenttype, data=[dict(field='chars', operator='regex', value='^ModelA chars 1')])
+            queryset = ModelA.objects.filter(search.as_q())
+            self.assertIn('LIKE', str(queryset.query))
+            expected = ModelA.objects.filter(chars__regex='^ModelA chars 1')
+            self.assertEqual(list(queryset.order_by('pk')), list(expected.order_by('pk')))
+
+            search = Search(contenttype=contenttype, data=[dict(field='datetime', operator='exact', value=value)])
+            queryset = ModelA.objects.filter(search.as_q())
+            expected = ModelA.objects.filter(datetime__date=timezone.localtime(value).date())
+            self.assertTrue(expected.exists())
+            self.assertEqual(list(queryset.order_by('pk')), list(expected.order_by('pk')))
+
+
+class IndexAdvisorTestCase(CreateTestDataMixin, TestCase):
+    def setUp(self):
+        contenttype = ContentType.objects.get_for_model(ModelA)
+        rules = [
+            dict(field='chars', operator='exact', value='ModelA chars 1'),
+            dict(field='text', operator='icontains', value='xyz'),
+            dict(field='model_b__chars', operator='startswith', value='ModelB'),
+        ]
+        Search.objects.create(name='Search 1', contenttype=contenttype, data=rules)
+        Search.objects.create(name='Search 2', contenttype=contenttype, data=rules[:1])
+
+    def test_missing_indexes(self):
+        missing_indexes = get_missing_indexes()
+        self.assertEqual([str(m) for m in missing_indexes], ['example.ModelA.chars', 'example.ModelB.chars'])
+        self.assertEqual([m.uses for m in missing_indexes], [2, 1])
+        self.assertIn('example.modela:model_b__chars', missing_indexes[1].field_lookups)
+        self.assertEqual(missing_indexes[0].status, 'missing')
+
+        # Unused fields and fields which could not use an index are listed on
+        # demand. Primary and foreign keys are indexed.
+        fields = [str(m) for m in get_missing_indexes(include_unused=True)]
+        self.assertIn('example.ModelA.text', fields)
+        self.assertNotIn('example.ModelA.id', fields)
+        self.assertNotIn('example.ModelA.model_b', fields)
+
+    def test_declared_index(self):
+        with mock.patch.object(ModelA._meta.get_field('chars'), 'db_index', True):
+            missing_indexes = get_missing_indexes()
+        self.assertEqual(missing_indexes[0].status, 'not migrated')
+
+    def test_index_command(self):
+        stdout = io.StringIO()
+        call_command('searchkit_indexes', '--migrations', stdout=stdout)
+        output = stdout.getvalue()
+        self.assertIn('example.ModelA.chars', output)
+        self.assertIn('migrations.AddIndex(', output)
+        self.assertIn("fields=['chars']", output)
+
+    def test_pattern_index(self):
+        # Only postgresql needs an operator class for pattern lookups.
+        missing_index = get_missing_indexes()[1]
+        self.assertEqual(missing_index.pattern_uses, 1)
+        self.assertEqual(len(missing_index.get_operations()), 1)
+        with mock.patch.object(connection, 'vendor', 'postgresql'):
+            operations = missing_index.get_operations()
+        self.assertEqual(len(operations), 1)
+        self.assertEqual(operations[0].index.opclasses, ['varchar_pattern_ops'])
+        self.assertTrue(operations[0].index.name.endswith('_pat'))
+
+    def test_index_check(self):
+        self.assertEqual(check_missing_indexes(None, databases=['default']), [])
+        with override_settings(SEARCHKIT_INDEX_CHECK_MIN_USES=1):
+            warnings = check_missing_indexes(None, databases=['default'])
+            self.assertEqual([w.id for w in warnings], ['searchkit.W001', 'searchkit.W001'])
+            self.assertEqual(warnings[0].obj, ModelA)
+            self.assertEqual(check_missing_indexes(None), [])
+        with override_settings(SEARCHKIT_INDEX_CHECK_MIN_USES=2):
+            self.assertEqual(len(check_missing_indexes(None, databases=['default'])), 1)
+
+    def test_shared_cache_check(self):
+        self.assertEqual([w.id for w in check_shared_cache(None)], ['searchkit.W002'])
+        with override_settings(SEARCHKIT_CACHE=None):
+            self.assertEqual(check_shared_cache(None), [])
+
+    @override_settings(SEARCHKIT_INDEX_CHECK_MIN_USES=1)
+    def test_unapplied_migrations(self):
+        # Saved searches could not be read before all migrations are applied.
+        with mock.patch('searchkit.advisor.MigrationExecutor.migration_plan', return_value=[mock.Mock()]):
+            self.assertEqual(check_missing_indexes(None, databases=['default']), [])
+            with self.assertRaises(CommandError):
+                call_command('searchkit_indexes', stdout=io.StringIO())
 
 
 class SearchTestCase(CreateTestDataMixin, TestCase):
@@ -675,6 +1807,152 @@ class SearchTestCase(CreateTestDataMixin, TestCase):
         self.assertIsInstance(q, Q)
         self.assertTrue(len(q) > 0)
 
+    @mock.patch.dict('searchkit.models._search_q_cache', clear=True)
+    def test_search_as_q_is_cached(self):
+        search = Search.objects.create(
+            name='Test search',
+            contenttype=ContentType.objects.get_for_model(ModelA),
+            data=INITIAL_DATA
+        )
+        with mock.patch.object(Search, 'build_q', autospec=True, side_effect=Search.build_q) as build_q:
+            # Loaded searches share the Q object but get a copy of their own.
+            q = Search.objects.get(pk=search.pk).as_q()
+            other_q = Search.objects.get(pk=search.pk).as_q()
+            self.assertEqual(build_q.call_count, 1)
+            self.assertIsNot(q, other_q)
+            self.assertEqual(q, other_q)
+
+            # Data not being saved is neither served from the cache nor put
+            # into it.
+            loaded = Search.objects.get(pk=search.pk)
+            loaded.data = INITIAL_DATA[:1]
+            self.assertNotEqual(loaded.as_q(), q)
+            self.assertEqual(Search.objects.get(pk=search.pk).as_q(), q)
+            self.assertEqual(build_q.call_count, 2)
+
+            # Neither are the data of unsaved searches.
+            unsaved = Search(contenttype=search.contenttype, data=INITIAL_DATA)
+            unsaved.as_q()
+            unsaved.as_q()
+            self.assertEqual(build_q.call_count, 4)
+
+            # Saving new data or a changed schema builds a new Q object.
+            loaded.save()
+            self.assertNotEqual(Search.objects.get(pk=search.pk).as_q(), q)
+            with mock.patch('searchkit.models.get_schema_hash', return_value='changed'):
+                Search.objects.get(pk=search.pk).as_q()
+            self.assertEqual(build_q.call_count, 6)
+
+    @mock.patch.dict('searchkit.models._search_q_cache', clear=True)
+    def test_search_filter_uses_cached_q(self):
+        search = Search.objects.create(
+            name='Test search',
+            contenttype=ContentType.objects.get_for_model(ModelA),
+            data=[dict(field='model_d__integer', operator='lt', value=50)]
+        )
+        admin = User.objects.get(username='admin')
+        self.client.force_login(admin)
+        url = reverse('admin:example_modela_changelist')
+        with mock.patch.object(Search, 'build_q', autospec=True, side_effect=Search.build_q) as build_q:
+            for i in range(2):
+                resp = self.client.get(f'{url}?{SearchkitFilter.parameter_name}={search.pk}')
+                self.assertEqual(resp.status_code, 200)
+        self.assertEqual(build_q.call_count, 1)
+
+    def test_search_data(self):
+        data = [
+            dict(field='date', operator='range', value=[datetime.date(2020, 1, 1), datetime.date(2021, 1, 1)]),
+            dict(field='decimal', operator='exact', value=Decimal('1.50'), logical_operator='or', negation=True),
+            dict(field='uuid', operator='exact', value=uuid.UUID(int=1)),
+            dict(field='time', operator='gt', value=datetime.time(12, 30)),
+            dict(field='datetime', operator='gt', value=datetime.datetime(2020, 1, 1, 12, tzinfo=datetime.timezone.utc)),
+            dict(field='chars', operator='in', value=['a', 'b']),
+        ]
+        search = Search.objects.create(
+            name='Test search',
+            contenttype=ContentType.objects.get_for_model(ModelA),
+            data=data,
+        )
+        self.assertEqual(Search.objects.get(pk=search.pk).data, data)
+
+        # Data is stored as versioned json with typed values.
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT data FROM searchkit_search WHERE id = %s', [search.pk])
+            raw = json.loads(cursor.fetchone()[0])
+        self.assertEqual(raw['version'], 1)
+        self.assertEqual(raw['rules'][1]['value'], {'$type': 'decimal', 'value': '1.50'})
+        self.assertEqual(raw['rules'][5]['value'], ['a', 'b'])
+
+    def test_search_as_q_with_to_many_rules(self):
+        contenttype = ContentType.objects.get_for_model(ModelA)
+        chars = ModelD.objects.order_by('pk').values_list('chars', flat=True)[0]
+        rules = [
+            [dict(field='model_d__chars', operator='exact', value=chars)],
+            [dict(field='model_d__chars', operator='exact', value=chars, negation=True)],
+            [dict(field='model_d__integer', operator='gt', value=2)],
+            [
+                dict(field='integer', operator='lt', value=5),
+                dict(field='model_d__chars', operator='exact', value=chars, logical_operator='or'),
+            ],
+            [
+                dict(field='model_b__chars', operator='isnull', value=False),
+                dict(field='model_d', operator='isnull', value=False),
+            ],
+        ]
+        for data in rules:
+            search = Search(contenttype=contenttype, data=data)
+            queryset = ModelA.objects.filter(search.as_q())
+            sql = str(queryset.query)
+            self.assertIn('EXISTS', sql)
+            self.assertNotIn('DISTINCT', sql)
+
+            # Same results as joining the relation.
+            joined = Q()
+            for rule in data:
+                q = Q(**{f'{rule["field"]}__{rule["operator"]}': rule['value']})
+                q = ~q if rule.get('negation') else q
+                joined = joined | q if rule.get('logical_operator') == 'or' else joined & q
+            expected = ModelA.objects.filter(joined).distinct()
+            self.assertTrue(expected.exists())
+            self.assertEqual(list(queryset.order_by('pk')), list(expected.order_by('pk')))
+
+        # And-ed rules over a relation are matched by the same related object.
+        obj = next(a for a in ModelA.objects.all() if len({d.integer for d in a.model_d.all()}) > 1)
+        d1, d2 = obj.model_d.order_by('integer').first(), obj.model_d.order_by('integer').last()
+        data = [
+            dict(field='model_d__chars', operator='exact', value=d1.chars),
+            dict(field='model_d__integer', operator='exact', value=d2.integer, logical_operator='and'),
+        ]
+        queryset = ModelA.objects.filter(Search(contenttype=contenttype, data=data).as_q())
+        self.assertEqual(str(queryset.query).count('EXISTS'), 1)
+        self.assertNotIn(obj, queryset)
+        expected = ModelA.objects.filter(model_d__chars=d1.chars, model_d__integer=d2.integer).distinct()
+        self.assertEqual(list(queryset.order_by('pk')), list(expected.order_by('pk')))
+
+        # Also if other rules are and-ed between them.
+        data.insert(1, dict(field='integer', operator='gte', value=0, logical_operator='and'))
+        queryset = ModelA.objects.filter(Search(contenttype=contenttype, data=data).as_q())
+        self.assertEqual(str(queryset.query).count('EXISTS'), 1)
+        self.assertNotIn(obj, queryset)
+        self.assertEqual(list(queryset.order_by('pk')), list(expected.filter(integer__gte=0).order_by('pk')))
+
+        # Searches of stale content types match nothing.
+        with mock.patch.object(ContentType, 'model_class', return_value=None):
+            self.assertEqual(Search(contenttype=contenttype, data=data).as_q(), Q(pk__in=[]))
+
+        # Single valued relations are still joined.
+        search = Search(contenttype=contenttype, data=[dict(field='model_b__chars', operator='isnull', value=False)])
+        self.assertNotIn('EXISTS', str(ModelA.objects.filter(search.as_q()).query))
+
+    def test_search_touching_field(self):
+        search = Search.objects.create(
+            name='Test search',
+            contenttype=ContentType.objects.get_for_model(ModelA),
+            data=INITIAL_DATA
+        )
+        self.assertEqual(list(Search.objects.touching_field('chars_choices')), [search])
+        self.assertEqual(list(Search.objects.touching_field('model_d__chars')), [])
+
     def test_search_details(self):
         search = Search.objects.create(
             name='Test search',
@@ -684,3 +1962,10 @@ class SearchTestCase(CreateTestDataMixin, TestCase):
         )
         details = search.details
         self.assertEqual(len(INITIAL_DATA), len(details.splitlines()))
+
+        # Rules rewritten by the hints of their field show their lookups.
+        value = datetime.datetime(2025, 5, 14, 8, 45, tzinfo=datetime.timezone.utc)
+        search.data = [dict(field='datetime', operator='exact', value=value)]
+        with mock.patch.object(ModelAAdmin, 'searchkit_field_hints', {'datetime': dict(precision='day')}, create=True):
+            self.assertIn('searched as datetime__gte', search.details)
+        self.assertNotIn('searched as', search.details)
@@ -1,9 +1,11 @@
 from django.urls import path
 from .views import SearchkitView
 from .views import AutocompleteView
+from .views import CatalogView
 
 
 urlpatterns = [
     path("reload/", SearchkitView.as_view(), name="searchkit-reload"),
     path("autocomplete/", AutocompleteView.as_view(), name="searchkit-autocomplete"),
+    path("catalog/", CatalogView.as_view(), name="searchkit-catalog"),
 ]
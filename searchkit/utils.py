@@ -1,26 +1,99 @@
+import json
+import hashlib
+import logging
+from functools import lru_cache
 from collections import OrderedDict
 from modeltree import ModelTree as BaseModelTree
 from django import forms
+from django.apps import apps
+from django.conf import settings
 from django.db import models
+from django.db.models.signals import class_prepared
+from django.db.models.signals import post_migrate
+from django.dispatch import receiver
+from django.core.exceptions import FieldDoesNotExist
+from django.core.signals import setting_changed
 from django.contrib import admin
 from django.contrib.admin import widgets
+from django.contrib.contenttypes.models import ContentType
+from django.utils import translation
+from django.utils.translation import get_language
 from django.utils.translation import gettext_lazy as _
 from django.template import Template, Context
 from django.contrib.admin.options import FORMFIELD_FOR_DBFIELD_DEFAULTS
 from . import fields as  skfields
+from .cache import get_cache
+from .cache import get_cache_key
+from .cache import get_cache_timeout
+from .cache import get_cardinality_timeout
+from .__version__ import __version__
+
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=None)
+def get_searchable_models():
+    """
+    Get all models that are registered with the admin site using a
+    SearchkitFilter or a subclass of it. The models are collected once on
+    first access which is after the admin autodiscovery.
+    """
+    # Import SearchkitFilter here to avoid circular imports.
+    from .filters import SearchkitFilter
+    is_searchkit_filter = lambda f: isinstance(f, type) and issubclass(f, SearchkitFilter)
+    models = [m for m, a in admin.site._registry.items() if any(is_searchkit_filter(f) for f in a.list_filter)]
+    return tuple(sorted(models, key=lambda m: (m._meta.app_label, m._meta.model_name)))
+
+
+@lru_cache(maxsize=None)
+def get_searchable_contenttype_ids():
+    """
+    Get the content type ids of all searchable models.
+    """
+    contenttypes = ContentType.objects.get_for_models(*get_searchable_models())
+    return tuple(contenttypes[m].id for m in get_searchable_models())
+
+
+@lru_cache(maxsize=None)
+def get_searched_models():
+    """
+    Get all models whose fields could be searched. These are the models in the
+    model trees of all searchable models and their parents.
+    """
+    searched_models = set()
+    for model in get_searchable_models():
+        tree = SearchSchema(model).get_model_tree_class()(model)
+        for node in tree.iterate():
+            searched_models.update([node.model, *node.model._meta.get_parent_list()])
+    return frozenset(searched_models)
+
+
+def is_searched_model(model):
+    """
+    Check if the fields of a model could be searched by Searchkit.
+    """
+    return model._meta.concrete_model in get_searched_models()
+
+
+@receiver(post_migrate)
+@receiver(setting_changed)
+def clear_searchable_models(**kwargs):
+    """
+    Collect searchable models and their content types anew when the installed
+    apps have changed or content types might have been created.
+    """
+    if kwargs.get('setting', 'INSTALLED_APPS') == 'INSTALLED_APPS':
+        get_searchable_models.cache_clear()
+        get_searchable_contenttype_ids.cache_clear()
+        get_searched_models.cache_clear()
 
 
 def is_searchable_model(model):
     """
     Check if the model is searchable by Searchkit.
     """
-    # FIXME: This fails if someone uses a custom searchkit filter class.
-    # We do not import SearchkitFilter to avoid circular imports. So we check
-    # the filter by its name.
-    return (
-        admin.site.is_registered(model)
-        and 'SearchkitFilter' in [getattr(f, '__name__', '') for f in admin.site._registry[model].list_filter]
-    )
+    return model in get_searchable_models()
 
 
 def get_value_representation(value):
@@ -52,10 +125,109 @@ def flatten_option_group_choices(choices):
     return flat_choices
 
 
-# TODO: Make modeltree parameters configurable.
+@lru_cache(maxsize=None)
+def get_multi_valued_prefix(model, field_lookup):
+    """
+    Return the path of a field lookup up to the first many-to-many or reverse
+    foreign key relation it follows or None if it follows no such relation.
+    """
+    names = field_lookup.split('__')
+    for i, name in enumerate(names):
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+        if not field.is_relation:
+            return None
+        if field.many_to_many or field.one_to_many:
+            return '__'.join(names[:i + 1])
+        model = field.related_model
+    return None
+
+
+def is_multi_valued_lookup(model, field_lookup):
+    """
+    Check if a field lookup follows a many-to-many or reverse foreign key
+    relation. Filtering over such relations joins several rows per object.
+    """
+    return get_multi_valued_prefix(model, field_lookup) is not None
+
+
 class ModelTree(BaseModelTree):
     MAX_DEPTH = 3
     FOLLOW_ACROSS_APPS = True
+    EXCLUDED_FIELD_PATHS = None
+
+    def _follow(self, field):
+        # Do not follow excluded field paths. Paths below them are never
+        # reached anyway.
+        if self.EXCLUDED_FIELD_PATHS:
+            field_path = field.name if self.is_root else f'{self.field_path}__{field.name}'
+            return field_path not in self.EXCLUDED_FIELD_PATHS
+        else:
+            return True
+
+
+class SearchSchema:
+    """
+    The search schema of a model as it is declared by the ModelAdmin the model
+    is registered with. These ModelAdmin attributes are supported:
+
+    * searchkit_max_depth: Max depth of relations to follow.
+    * searchkit_follow_across_apps: Follow relations to models of other apps.
+    * searchkit_relations: Relation paths to follow. By default all relations
+      are followed.
+    * searchkit_exclude_relations: Relation paths not to follow.
+    * searchkit_fields: Field lookups to offer. By default all fields are
+      offered.
+    * searchkit_exclude_fields: Field lookups not to offer.
+    * searchkit_max_fields: Max number of field lookups to offer.
+    * searchkit_field_hints: Hints about the data and indexes of field lookups
+      used to rewrite the operators of rules. See rewrite_rule().
+    """
+    def __init__(self, model):
+        model_admin = admin.site._registry.get(model)
+        self.max_depth = getattr(model_admin, 'searchkit_max_depth', ModelTree.MAX_DEPTH)
+        self.follow_across_apps = getattr(model_admin, 'searchkit_follow_across_apps', ModelTree.FOLLOW_ACROSS_APPS)
+        self.relations = getattr(model_admin, 'searchkit_relations', None)
+        self.exclude_relations = getattr(model_admin, 'searchkit_exclude_relations', None)
+        self.fields = getattr(model_admin, 'searchkit_fields', None)
+        self.exclude_fields = getattr(model_admin, 'searchkit_exclude_fields', None)
+        self.max_fields = getattr(model_admin, 'searchkit_max_fields', None)
+        self.field_hints = getattr(model_admin, 'searchkit_field_hints', None) or dict()
+
+    def serialize(self):
+        return {k: list(v) if isinstance(v, (list, tuple)) else v for k, v in vars(self).items()}
+
+    def get_model_tree_class(self, **attrs):
+        """
+        Get a ModelTree class following the relations of the schema. Further
+        class attributes could be passed in as keyword arguments.
+        """
+        attrs = {
+            'MAX_DEPTH': self.max_depth,
+            'FOLLOW_ACROSS_APPS': self.follow_across_apps,
+            'FIELD_PATHS': self.relations,
+            'EXCLUDED_FIELD_PATHS': self.exclude_relations,
+            **attrs
+        }
+        return type('ModelTree', (ModelTree,), attrs)
+
+    def follows_relation_path(self, relation_path):
+        # A relation path is followed if it is one of the relation paths of the
+        # schema or leads to one of them.
+        if self.relations:
+            return any(f'{p}__'.startswith(f'{relation_path}__') for p in self.relations)
+        else:
+            return True
+
+    def includes_field_lookup(self, field_lookup):
+        if self.fields is not None and field_lookup not in self.fields:
+            return False
+        elif self.exclude_fields and field_lookup in self.exclude_fields:
+            return False
+        else:
+            return True
 
 
 class FieldPlan:
@@ -127,101 +299,57 @@ class FieldPlan:
     )
 
 
-    def __init__(self, model, initial=None):
+    def __init__(self, model):
         self.model = model
-        self.model_tree = ModelTree(model)
-        self.initial = initial or dict()
-        self.field_lookup = None
-        self.model_field = None
+        self.catalog = get_field_catalog(model)
+        # Set once form fields depend on the data of the models.
+        self.uses_data = False
 
-    def _get_model_field(self):
-        # Split the lookup. The last piece will be the field name. Everything
-        # else are relational fields.
-        path = self.field_lookup.split('__')
-
-        # If we have a path to a related model we use the model tree.
-        if len(path) > 1:
-            model = self.model_tree.get('__'.join(path[:-1])).model
-        else:
-            model = self.model
-
-        return model._meta.get_field(path[-1])
+    def get_model_field(self, field_lookup):
+        return self.catalog.get_model_field(field_lookup)
 
     def get_field_lookup_choices(self):
-        # Not all fields have a verbose_name attribute.
-        get_field_name = lambda f: str(getattr(f, 'verbose_name', f.name))
-        choices = []
+        return self.catalog.choices
 
-        # Iterate the model tree...
-        for node in self.model_tree.iterate():
+    def get_field_lookup_label(self, field_lookup):
+        return self.catalog.get_label(field_lookup)
 
-            # Create a new option group for each model.
-            if node.is_root:
-                opt_group = (None, [])
-            else:
-                relations = ['one_to_one', 'many_to_one', 'one_to_many', 'many_to_many']
-                relation = [r.replace('_', '-') for r in relations if getattr(node.field, r)][0]
-                group_label = ' . '.join([get_field_name(n.field) for n in node.path[1:]])
-                group_label += f' => {node.model._meta.app_label.title()} | {node.model._meta.verbose_name} ({relation})'
-                opt_group = (group_label, [])
-
-            # Loop the model fields to build the option group.
-            for model_field in node.model._meta.get_fields():
-
-                # Skip unsupported fields that are no relational fields.
-                if (
-                    not model_field.is_relation
-                    and not isinstance(model_field, self.SUPPORTED_FIELD_TYPES)
-                ):
-                    continue
-
-                # Skip relational fields that could not be null.
-                elif (
-                    model_field.is_relation
-                    and (model_field.one_to_one or model_field.many_to_one)
-                    and not model_field.null
-                ):
-                    continue
-
-                # Prevent reversion of relational fields.
-                elif model_field.is_relation and model_field.remote_field == node.field:
-                    continue
-
-                if node.is_root:
-                    lookup = model_field.name
-                    label = get_field_name(model_field)
-                else:
-                    lookup = f'{node.field_path}__{model_field.name}'
-                    label = ' . '.join([get_field_name(n.field) for n in node.path[1:]] + [get_field_name(model_field)])
-
-                opt_group[1].append((lookup, label))
+    def is_valid_field_lookup(self, field_lookup):
+        try:
+            self.catalog.get_model_field(field_lookup)
+        except FieldDoesNotExist:
+            return False
+        else:
+            return True
 
-            # Append the option group to the choices.
-            choices.append(opt_group)
+    def get_operator_choices(self, field_lookup):
+        model_field = self.get_model_field(field_lookup)
 
-        return choices
+        # Operator choices only depend on the model field. So we build them
+        # once per field lookup and keep them in the catalog.
+        if field_lookup not in self.catalog.operator_choices:
+            self.catalog.operator_choices[field_lookup] = self._build_operator_choices(model_field)
+        return self.catalog.operator_choices[field_lookup]
 
-    def get_operator_choices(self, field_lookup):
-        self.field_lookup = field_lookup
-        self.model_field = self._get_model_field()
+    def _build_operator_choices(self, model_field):
         operators = OrderedDict()
         operators[None] = []
 
-        if isinstance(self.model_field, models.BooleanField):
+        if isinstance(model_field, models.BooleanField):
             operators[None] = ['exact']
 
-        elif isinstance(self.model_field, models.TextField):
+        elif isinstance(model_field, models.TextField):
             operators['case insensitive'] = ['icontains', 'istartswith', 'iendswith', 'iregex']
             operators['case sensitive'] = ['contains', 'startswith', 'endswith', 'regex']
 
-        elif isinstance(self.model_field, self.CHARACTER_FIELD_TYPES):
+        elif isinstance(model_field, self.CHARACTER_FIELD_TYPES):
             operators['case insensitive'] = ['iexact', 'icontains', 'istartswith', 'iendswith', 'iregex']
             operators['case sensitive'] = ['exact', 'contains', 'startswith', 'endswith', 'regex', 'in']
 
-        elif isinstance(self.model_field, self.ARITHMETIC_FIELD_TYPES):
+        elif isinstance(model_field, self.ARITHMETIC_FIELD_TYPES):
             operators[None] = ['exact', 'gt', 'gte', 'lt', 'lte', 'range']
 
-        elif self.model_field.is_relation:
+        elif model_field.is_relation:
             operators[None] = ['isnull']
 
         # Add an isnull lookup for model fields allowing null values.
@@ -229,17 +357,98 @@ class FieldPlan:
         # Exclude boolean fields since they are handled with a null boolean form
         # field.
         if (
-            self.model_field.null
-            and not self.model_field.is_relation
-            and not isinstance(self.model_field, models.BooleanField)
+            model_field.null
+            and not model_field.is_relation
+            and not isinstance(model_field, models.BooleanField)
         ):
             operators[None] = [*operators[None], 'isnull']
 
-        # Build the final choices list.
-        return [(g, [(l, self.OPERATOR_DESCRIPTION[l]) for l in o]) for g, o in operators.items()]
-
-    def get_form_field(self, operator):
-        model_field_class = type(self.model_field)
+        # Build the final choices. They are shared by all forms. So we use
+        # tuples to keep them immutable.
+        return tuple((g, tuple((l, self.OPERATOR_DESCRIPTION[l]) for l in o)) for g, o in operators.items())
+
+    def get_max_inline_choices(self):
+        # Inline choices rely on the cache to notice changes of the data.
+        if get_cache():
+            return getattr(settings, 'SEARCHKIT_MAX_INLINE_CHOICES', 50)
+
+    def uses_value_choices(self, field_lookup, operator):
+        """
+        Return True if the form field of a field lookup and an operator
+        depends on the values of the model field.
+        """
+        model_field = self.get_model_field(field_lookup)
+        return bool(
+            operator in ['exact', 'in']
+            and isinstance(model_field, self.CHARACTER_FIELD_TYPES)
+            and not model_field.choices
+            and self.get_max_inline_choices()
+        )
+
+    def get_client_catalog(self):
+        """
+        Return the field lookups, their operators and the html of their value
+        widgets to switch them on the client. Widgets are deduplicated and use
+        __prefix__ as placeholder for the form prefix. Widgets depending on the
+        values of a model field are None and have to be loaded from the server.
+        """
+        if self.catalog.client_catalog is None:
+            htmls, values, operators = dict(), dict(), dict()
+            for group, options in self.get_field_lookup_choices():
+                for lookup, label in options:
+                    operators[lookup] = self.get_operator_choices(lookup)
+                    values[lookup] = dict()
+                    for operator in (o for g, ops in operators[lookup] for o, l in ops):
+                        if self.uses_value_choices(lookup, operator):
+                            values[lookup][operator] = None
+                            continue
+                        widget = self.get_form_field(lookup, operator).widget
+                        html = widget.render('__prefix__-value', None, attrs={'id': 'id___prefix__-value'})
+                        values[lookup][operator] = htmls.setdefault(html, len(htmls))
+            self.catalog.client_catalog = dict(
+                fields=self.get_field_lookup_choices(),
+                operators=operators,
+                widgets=list(htmls),
+                values=values,
+            )
+        return self.catalog.client_catalog
+
+    def get_value_choices(self, model_field):
+        """
+        Return the distinct values of a model field as choices if there are
+        not more than SEARCHKIT_MAX_INLINE_CHOICES of them. Otherwise return
+        None. The values are cached until the data of the model changes.
+        Fields with too many values are remembered for
+        SEARCHKIT_CARDINALITY_TIMEOUT seconds regardless of changes.
+        """
+        max_choices = self.get_max_inline_choices()
+        if not max_choices:
+            return None
+
+        self.uses_data = True
+        cache = get_cache()
+        parts = (model_field.model, model_field.attname, max_choices)
+        # A single change rarely makes a field with many values have few.
+        cardinality_key = get_cache_key('cardinality', *parts, versioned=False)
+        if cache.get(cardinality_key):
+            return None
+
+        key = get_cache_key('choices', *parts)
+        values = cache.get(key)
+        if values is None:
+            # Fetch one more value to know if there are too many.
+            queryset = skfields.get_value_queryset(model_field)
+            values = [str(v) for v in queryset[:max_choices + 1]]
+            if len(values) > max_choices:
+                cache.set(cardinality_key, True, get_cardinality_timeout())
+                return None
+            cache.set(key, values, get_cache_timeout())
+
+        return [(v, v) for v in values]
+
+    def get_form_field(self, field_lookup, operator):
+        model_field = self.get_model_field(field_lookup)
+        model_field_class = type(model_field)
 
         # Use a simple boolean form field for the isnull operator.
         if operator == 'isnull':
@@ -249,24 +458,29 @@ class FieldPlan:
                 )
 
         # Create form field for character based field types.
-        elif isinstance(self.model_field, self.CHARACTER_FIELD_TYPES):
+        elif isinstance(model_field, self.CHARACTER_FIELD_TYPES):
 
             # With these operators we use a standard search term field.
             if operator in ['iexact', 'contains', 'icontains', 'startswith',
                             'istartswith', 'endswith', 'iendswith', 'regex', 'iregex']:
                 form_field = forms.CharField(widget=widgets.AdminTextInputWidget)
 
-            # Use a choice field for exact and in operators.
-            # FIXME: We might should use a simple ChoiceField if the model's
-            # field have choices defined.
+            # Use a choice field for exact and in operators. Declared choices
+            # and small sets of values are rendered inline. Otherwise values
+            # are loaded via AJAX.
             elif operator in ['exact', 'in']:
-                if operator == 'exact':
-                    form_field = skfields.Select2Field(self.model_field)
+                choices = model_field.choices or self.get_value_choices(model_field)
+                if choices and operator == 'exact':
+                    form_field = forms.ChoiceField(choices=choices)
+                elif choices and operator == 'in':
+                    form_field = forms.MultipleChoiceField(choices=choices)
+                elif operator == 'exact':
+                    form_field = skfields.Select2Field(model_field)
                 elif operator == 'in':
-                    form_field = skfields.MultiSelect2Field(self.model_field)
+                    form_field = skfields.MultiSelect2Field(model_field)
 
         # Handle arithmentic based field types.
-        elif isinstance(self.model_field, self.ARITHMETIC_FIELD_TYPES):
+        elif isinstance(model_field, self.ARITHMETIC_FIELD_TYPES):
             # Use range fields for the range operator.
             if operator == 'range':
 
@@ -284,8 +498,8 @@ class FieldPlan:
 
             # For exact operator only use a choice field if the model field has
             # choices.
-            elif operator == 'exact' and self.model_field.choices:
-                form_field = forms.ChoiceField(choices=self.model_field.choices)
+            elif operator == 'exact' and model_field.choices:
+                form_field = forms.ChoiceField(choices=model_field.choices)
 
             # TODO: Check the core code on how they use the defaults.
 
@@ -303,7 +517,7 @@ class FieldPlan:
 
                 # Otherwise get the type of the formfield returned by the model
                 # field.
-                _form_field = self.model_field.formfield()
+                _form_field = model_field.formfield()
                 klass = klass or type(_form_field) if _form_field else None
 
                 # Model fields as AutoField and BigAutoField return None for
@@ -314,11 +528,11 @@ class FieldPlan:
                 form_field = klass(**defaults)
 
         # Handle BooleanField
-        elif isinstance(self.model_field, models.BooleanField):
+        elif isinstance(model_field, models.BooleanField):
             # The formfield method is aware of the null attribute and returns a
             # null-boolean form field.
-            if self.model_field.null:
-                form_field = self.model_field.formfield()
+            if model_field.null:
+                form_field = model_field.formfield()
 
             # Otherwise we use a Select widget with True and False.
             else:
@@ -332,3 +546,327 @@ class FieldPlan:
             raise ValueError("Cannot build a form field for the given model field and operator.")
 
         return form_field
+
+
+class FieldCatalog:
+    """
+    Catalog of all searchable field lookups of a model. It holds the option
+    groups for the "Model field" choices, the model field and label of each
+    lookup and the operator choices of each lookup which are added on demand by
+    the FieldPlan.
+
+    Building the choices means walking the whole model tree. This is done
+    not until the choices are accessed. Single field lookups are resolved by
+    only following the relations named in the lookup.
+
+    Do not instantiate a catalog directly but use get_field_catalog() to get a
+    cached one. Catalogs could also be loaded from their serialized form as it
+    is written to the field catalog file.
+    """
+    def __init__(self, model, data=None):
+        self.model = model
+        self.schema = SearchSchema(model)
+        self.model_fields = dict()
+        self.labels = dict()
+        self.operator_choices = dict()
+        self.client_catalog = None
+        self._choices = None
+        if data:
+            self._load(data)
+
+    @property
+    def choices(self):
+        if self._choices is None:
+            self._build()
+        return self._choices
+
+    def get_model_fields(self):
+        """
+        Return the model fields of all field lookups of the catalog by their
+        lookup.
+        """
+        if self._choices is None:
+            self._build()
+        return self.model_fields
+
+    def _load(self, data):
+        self._choices = tuple((g, tuple(tuple(c) for c in o)) for g, o in data['choices'])
+        self.labels = dict(c for g, o in self._choices for c in o)
+        for lookup, (model_label, field_name) in data['model_fields'].items():
+            model = apps.get_model(model_label)
+            self.model_fields[lookup] = model._meta.get_field(field_name)
+        for lookup, operators in data['operators'].items():
+            self.operator_choices[lookup] = tuple(
+                (g, tuple((l, FieldPlan.OPERATOR_DESCRIPTION[l]) for l in o)) for g, o in operators)
+
+    def serialize(self):
+        """
+        Return the catalog as json serializable dictionary including the
+        operator choices for all field lookups.
+        """
+        choices = self.choices
+        field_plan = FieldPlan(self.model)
+        operators = dict()
+        for lookup in self.model_fields:
+            operator_choices = field_plan.get_operator_choices(lookup)
+            operators[lookup] = [(g, [c[0] for c in o]) for g, o in operator_choices]
+        return dict(
+            choices=choices,
+            model_fields={l: (f.model._meta.label_lower, f.name) for l, f in self.model_fields.items()},
+            operators=operators,
+        )
+
+    def get_model_field(self, field_lookup):
+        """
+        Get the model field of a field lookup. Raise FieldDoesNotExist if the
+        lookup is not part of the catalog.
+        """
+        # If the number of fields is limited we cannot tell from the lookup
+        # itself if it is part of the catalog. So we need to build the choices.
+        if field_lookup not in self.model_fields and self._choices is None and self.schema.max_fields:
+            self._build()
+
+        if field_lookup not in self.model_fields:
+            # Once the choices are built we know all valid lookups.
+            if self._choices is None:
+                self._resolve(field_lookup)
+            else:
+                self._raise_field_does_not_exist(field_lookup)
+        return self.model_fields[field_lookup]
+
+    def get_label(self, field_lookup):
+        self.get_model_field(field_lookup)
+        return self.labels[field_lookup]
+
+    def _raise_field_does_not_exist(self, field_lookup):
+        msg = f"{self.model._meta.object_name} has no searchable field lookup '{field_lookup}'"
+        raise FieldDoesNotExist(msg)
+
+    def _resolve(self, field_lookup):
+        # Split the lookup. The last piece will be the field name. Everything
+        # else are relational fields.
+        path = field_lookup.split('__')
+        relation_path = '__'.join(path[:-1])
+
+        # Build a model tree that only follows the relations of the lookup. So
+        # we get the same validation of reachability and depth as for the
+        # whole tree.
+        if relation_path and not self.schema.follows_relation_path(relation_path):
+            self._raise_field_does_not_exist(field_lookup)
+        elif relation_path:
+            attrs = dict(FIELD_PATHS=[relation_path])
+        else:
+            # We only need the root node.
+            attrs = dict(MAX_DEPTH=0)
+        model_tree = self.schema.get_model_tree_class(**attrs)(self.model)
+        node = model_tree.get(relation_path) if relation_path else model_tree
+
+        if node is None:
+            self._raise_field_does_not_exist(field_lookup)
+        try:
+            model_field = node.model._meta.get_field(path[-1])
+        except FieldDoesNotExist:
+            self._raise_field_does_not_exist(field_lookup)
+        if not self._is_searchable(node, model_field, field_lookup):
+            self._raise_field_does_not_exist(field_lookup)
+
+        self.model_fields[field_lookup] = model_field
+        self.labels[field_lookup] = self._get_label(node, model_field)
+
+    def _is_searchable(self, node, model_field, field_lookup):
+        # Skip fields that are excluded by the search schema.
+        if not self.schema.includes_field_lookup(field_lookup):
+            return False
+
+        # Skip unsupported fields that are no relational fields.
+        elif (
+            not model_field.is_relation
+            and not isinstance(model_field, FieldPlan.SUPPORTED_FIELD_TYPES)
+        ):
+            return False
+
+        # Skip relational fields that could not be null.
+        elif (
+            model_field.is_relation
+            and (model_field.one_to_one or model_field.many_to_one)
+            and not model_field.null
+        ):
+            return False
+
+        # Prevent reversion of relational fields.
+        elif model_field.is_relation and model_field.remote_field == node.field:
+            return False
+
+        else:
+            return True
+
+    def _get_label(self, node, model_field):
+        # Not all fields have a verbose_name attribute.
+        get_field_name = lambda f: str(getattr(f, 'verbose_name', f.name))
+        return ' . '.join([get_field_name(n.field) for n in node.path[1:]] + [get_field_name(model_field)])
+
+    def _build(self):
+        # Not all fields have a verbose_name attribute.
+        get_field_name = lambda f: str(getattr(f, 'verbose_name', f.name))
+        choices = []
+        model_fields = dict()
+        labels = dict()
+        truncated = False
+
+        # Iterate the model tree...
+        for node in self.schema.get_model_tree_class()(self.model).iterate():
+
+            # Create a new option group for each model.
+            if node.is_root:
+                opt_group = (None, [])
+            else:
+                relations = ['one_to_one', 'many_to_one', 'one_to_many', 'many_to_many']
+                relation = [r.replace('_', '-') for r in relations if getattr(node.field, r)][0]
+                group_label = ' . '.join([get_field_name(n.field) for n in node.path[1:]])
+                group_label += f' => {node.model._meta.app_label.title()} | {node.model._meta.verbose_name} ({relation})'
+                opt_group = (group_label, [])
+
+            # Loop the model fields to build the option group.
+            for model_field in node.model._meta.get_fields():
+                if node.is_root:
+                    lookup = model_field.name
+                else:
+                    lookup = f'{node.field_path}__{model_field.name}'
+
+                if not self._is_searchable(node, model_field, lookup):
+                    continue
+
+                # Stop adding fields if we reached the limit of the schema.
+                if self.schema.max_fields and len(model_fields) >= self.schema.max_fields:
+                    truncated = True
+                    break
+
+                label = self._get_label(node, model_field)
+
+                opt_group[1].append((lookup, label))
+                model_fields[lookup] = model_field
+                labels[lookup] = label
+
+            # Append the option group to the choices. Models might have no
+            # fields left that are offered by the search schema.
+            if opt_group[1]:
+                choices.append((opt_group[0], tuple(opt_group[1])))
+
+            # Only warn if there was a field left we could not offer.
+            if truncated:
+                logger.warning(
+                    f'Searchkit field catalog of {self.model._meta.label} is '
+                    f'limited to {self.schema.max_fields} fields.'
+                )
+                break
+
+        # The choices are shared by all forms. So we use tuples to keep them
+        # immutable.
+        self.model_fields = model_fields
+        self.labels = labels
+        self._choices = tuple(choices)
+
+
+# Field catalogs by model label and language. Labels are rendered while the
+# catalog is built. That's why we need a catalog for each language.
+_field_catalogs = dict()
+
+# Serialized field catalogs as they were loaded from the field catalog file.
+_persisted_field_catalogs = dict()
+
+
+@lru_cache(maxsize=None)
+def get_schema_hash():
+    """
+    Get a hash describing the fields and relations of all installed models.
+    Field catalogs are only valid for the schema hash they were built with.
+    """
+    schema = [__version__]
+    # Use the untranslated verbose names since the hash must be the same for
+    # all languages.
+    with translation.override(None):
+        for model in sorted(apps.get_models(), key=lambda m: m._meta.label_lower):
+            fields = []
+            for field in model._meta.get_fields():
+                related_model = field.related_model._meta.label_lower if field.related_model else None
+                verbose_name = str(getattr(field, 'verbose_name', field.name))
+                null = getattr(field, 'null', False)
+                fields.append((field.name, type(field).__name__, verbose_name, null, related_model))
+            search_schema = SearchSchema(model).serialize()
+            schema.append((model._meta.label_lower, str(model._meta.verbose_name), fields, search_schema))
+    return hashlib.sha1(json.dumps(schema).encode('utf-8')).hexdigest()
+
+
+def get_field_catalog_file():
+    return getattr(settings, 'SEARCHKIT_FIELD_CATALOG_FILE', None)
+
+
+def dump_field_catalogs(path, models, languages):
+    """
+    Write the field catalogs of the models for each language to path.
+    """
+    catalogs = dict()
+    for language in languages:
+        with translation.override(language):
+            catalogs[get_language()] = {
+                m._meta.label_lower: get_field_catalog(m).serialize() for m in models}
+    data = dict(schema_hash=get_schema_hash(), catalogs=catalogs)
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(data, file, separators=(',', ':'))
+
+
+def load_field_catalog_file():
+    """
+    Load the serialized field catalogs from the field catalog file. The schema
+    hash is not checked until a catalog is requested.
+    """
+    _persisted_field_catalogs.clear()
+    path = get_field_catalog_file()
+    if not path:
+        return
+    try:
+        with open(path, encoding='utf-8') as file:
+            _persisted_field_catalogs.update(json.load(file))
+    except FileNotFoundError:
+        logger.warning(f'Searchkit field catalog file {path} does not exist.')
+    except (OSError, ValueError) as exc:
+        logger.warning(f'Could not load searchkit field catalog file {path}: {exc}')
+
+
+def _get_persisted_field_catalog(model, language):
+    if not _persisted_field_catalogs:
+        return None
+    elif _persisted_field_catalogs.get('schema_hash') != get_schema_hash():
+        # The models changed since the catalogs were dumped. So we fall back
+        # to build our catalogs on our own.
+        logger.warning('Searchkit field catalog file is outdated. Please rebuild it.')
+        _persisted_field_catalogs.clear()
+        return None
+    else:
+        catalogs = _persisted_field_catalogs['catalogs'].get(language, dict())
+        return catalogs.get(model._meta.label_lower)
+
+
+def get_field_catalog(model):
+    """
+    Get the field catalog of a model for the active language. The catalog is
+    loaded from the field catalog file or built once per process and kept until
+    the app registry changes.
+    """
+    key = (model._meta.label_lower, get_language())
+    if key not in _field_catalogs:
+        data = _get_persisted_field_catalog(model, key[1])
+        _field_catalogs[key] = FieldCatalog(model, data)
+    return _field_catalogs[key]
+
+
+@receiver(class_prepared)
+@receiver(setting_changed)
+def clear_field_catalogs(**kwargs):
+    """
+    Drop all field catalogs when a model is added to the app registry or the
+    installed apps have changed.
+    """
+    if kwargs.get('setting', 'INSTALLED_APPS') == 'INSTALLED_APPS':
+        _field_catalogs.clear()
+        get_schema_hash.cache_clear()
@@ -1,15 +1,34 @@
+import json
+import hashlib
 from rest_framework.views import APIView
 from rest_framework.exceptions import APIException
+from rest_framework.exceptions import ParseError
 from rest_framework.permissions import BasePermission
 from rest_framework.response import Response
 from rest_framework.renderers import JSONRenderer
 from rest_framework.renderers import StaticHTMLRenderer
 from django.apps import apps
+from django.contrib.contenttypes.models import ContentType
+from django.utils.http import urlsafe_base64_decode
+from django.utils.http import urlsafe_base64_encode
 from django.utils.translation import gettext_lazy as _
+from django.template.loader import render_to_string
+from django.utils.cache import patch_cache_control
+from django.utils.decorators import method_decorator
+from django.utils.translation import get_language
+from django.views.decorators.http import condition
 from django.core.exceptions import FieldDoesNotExist
 from django.core.exceptions import PermissionDenied
+from .cache import get_cache
+from .cache import get_cache_key
+from .cache import get_cache_timeout
+from .index import get_value_index
+from .fields import get_value_queryset
 from .forms import SearchkitModelForm
 from .forms import searchkit_formset_factory
+from .utils import FieldPlan
+from .utils import get_schema_hash
+from .utils import is_searchable_model
 
 
 class InvalidSearchkitModel(APIException):
@@ -18,6 +37,18 @@ class InvalidSearchkitModel(APIException):
     default_code = 'invalid_searchkit_model'
 
 
+class InvalidSearchkitForm(APIException):
+    status_code = 400
+    default_detail = _('Invalid searchkit form.')
+    default_code = 'invalid_searchkit_form'
+
+
+class OutdatedCursor(APIException):
+    status_code = 409
+    default_detail = _('The values have changed. Please search again.')
+    default_code = 'outdated_cursor'
+
+
 class SearchkitPermission(BasePermission):
     def has_permission(self, request, view):
         # Allow access only if the user has the 'add' or 'change' permissions.
@@ -27,13 +58,63 @@ class SearchkitPermission(BasePermission):
         )
 
 
-class SearchkitView(APIView):
+def get_etag(*parts):
+    return hashlib.sha1(json.dumps(parts, default=str).encode('utf-8')).hexdigest()
+
+
+def get_data_versions(*models):
+    # Without a cache we cannot tell if the data has changed.
+    if get_cache():
+        return [get_cache_key('etag', m) for m in sorted(set(models), key=lambda m: m._meta.label_lower)]
+
+
+class RevalidateMixin:
+    """
+    Let clients cache our responses but revalidate them with each request.
+    Views answer conditional requests by decorating their get method with
+    django's condition decorator.
+    """
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+def get_reload_etag(request, **kwargs):
+    """
+    The formset changes with the schema, the language and the request
+    parameters. Inline value choices also change with the data of the models
+    of the selected field lookups.
+    """
+    try:
+        model = ContentType.objects.get_for_id(int(request.GET['searchkit_model'])).model_class()
+    except (KeyError, ValueError, ContentType.DoesNotExist):
+        return None
+    if model is None:
+        return None
+    # Do not build field plans for models the view would reject anyway.
+    if not is_searchable_model(model):
+        raise InvalidSearchkitModel
+
+    models = [model]
+    field_plan = FieldPlan(model)
+    for key, values in request.GET.lists():
+        if key.endswith('-field'):
+            models += [field_plan.get_model_field(v).model for v in values if field_plan.is_valid_field_lookup(v)]
+
+    params = sorted(request.GET.lists())
+    return get_etag(get_schema_hash(), get_language(), params, get_data_versions(*models))
+
+
+class SearchkitView(RevalidateMixin, APIView):
     """
     Update the searchkit formset via ajax.
     """
     permission_classes = [SearchkitPermission]
     renderer_classes = [StaticHTMLRenderer]
+    form_template_name = 'searchkit/searchkit_form.html'
 
+    @method_decorator(condition(etag_func=get_reload_etag))
     def get(self, request, **kwargs):
 
         model_form = SearchkitModelForm(data=request.GET)
@@ -43,21 +124,80 @@ class SearchkitView(APIView):
             raise InvalidSearchkitModel(model_form.errors)
 
         formset = searchkit_formset_factory(model=model)(data=request.GET)
+
+        # Only build and render a single form if the reload was triggered by
+        # one of its fields. So the costs do not grow with the number of forms.
+        if 'sk_reload_form' in request.GET:
+            try:
+                index = int(request.GET['sk_reload_form'])
+                form = formset.get_form(index)
+            except (ValueError, IndexError) as e:
+                raise InvalidSearchkitForm from e
+            form._errors = dict()
+            context = dict(form=form, index=index)
+            return self.get_response(render_to_string(self.form_template_name, context), formset)
+
         # We reset all errors of the forms since this is no submission but a
         # reload. (Errors are unavoidable when rebuilding the operator field.)
         for form in formset.forms:
             form._errors = dict()
-        return Response(formset.render())
+        return self.get_response(formset.render(), formset)
+
+    def get_response(self, html, formset):
+        response = Response(html)
+        # Clients may keep fragments in memory unless they hold choices taken
+        # from the data. These need to be revalidated with each request.
+        response['X-Searchkit-Memoize'] = '0' if formset.field_plan.uses_data else '1'
+        return response
+
+
+def get_catalog_etag(request, **kwargs):
+    # The catalog only changes with the schema of the models and the language.
+    return get_etag(get_schema_hash(), get_language(), request.GET.get('searchkit_model'))
+
+
+class CatalogView(RevalidateMixin, APIView):
+    """
+    Field catalog of a model to switch operator and value fields on the client.
+    """
+    permission_classes = [SearchkitPermission]
+    renderer_classes = [JSONRenderer]
+
+    @method_decorator(condition(etag_func=get_catalog_etag))
+    def get(self, request, **kwargs):
+        model_form = SearchkitModelForm(data=request.GET)
+        if model_form.is_valid():
+            model = model_form.cleaned_data['searchkit_model'].model_class()
+        else:
+            raise InvalidSearchkitModel(model_form.errors)
+
+        return Response(FieldPlan(model).get_client_catalog())
 
 
-class AutocompleteView(APIView):
+def get_autocomplete_etag(request, **kwargs):
+    # The values only change with the data of the model.
+    try:
+        model = apps.get_model(
+            request.GET['sk_autocomplete_app_label'],
+            request.GET['sk_autocomplete_model_name'],
+        )
+    except (KeyError, LookupError):
+        return None
+    if versions := get_data_versions(model):
+        return get_etag(get_schema_hash(), sorted(request.GET.lists()), versions)
+
+
+class AutocompleteView(RevalidateMixin, APIView):
     """
     Autocomplete view for select2 value fields.
     """
     permission_classes = [SearchkitPermission]
     renderer_classes = [JSONRenderer]
     paginate_by = 25
+    max_results = 500
+    max_response_size = 10000
 
+    @method_decorator(condition(etag_func=get_autocomplete_etag))
     def get(self, request, **kwargs):
         try:
             app_label = request.GET['sk_autocomplete_app_label']
@@ -81,27 +221,154 @@ class AutocompleteView(APIView):
             msg = f"User {request.user} is not allowed to view {model_name}"
             raise PermissionDenied(msg)
 
-        # We use distinct together with an order by the field in question. This
-        # neutralizes all former order_by clauses which might add columns to the
-        # sql distinct statement. See the django docs for more details.
-        queryset = model.objects.values_list(field.attname, flat=True)
-        queryset = queryset.order_by(field.attname).distinct()
+        # Null values are excluded. They would break our keyset pagination.
+        queryset = get_value_queryset(field, model)
+
+        term = request.GET.get('term')
+        cursor = request.GET.get('cursor')
+        try:
+            page = int(request.GET.get('page', 1))
+        except ValueError as e:
+            raise ParseError(_('Invalid page.')) from e
 
-        if term := request.GET.get('term'):
-            # FIXME: How to handle very big search results?
-            queryset = queryset.filter(**{f'{field.attname}__icontains': term})
-            more = False
+        # Distinct values rarely change. So we cache the results until the
+        # data of the model changes.
+        if cache := get_cache():
+            key = get_cache_key('autocomplete', model, field.name, term, cursor, page)
+            if (result := cache.get(key)) is not None:
+                return Response(result)
 
+        # Small sets of values are answered from an in-process index. It orders
+        # and matches values by python and not by the collation of the
+        # database. So pages of a cursor are served by the source which issued
+        # it. Cursors of an outdated index are rejected. Processes without the
+        # index build it right away.
+        cursor = self.decode_cursor(cursor)
+        if cursor is None:
+            index = get_value_index(queryset, field)
+        elif cursor.get('source') == 'index':
+            index = get_value_index(queryset, field, wait=True)
+            if index is None or index.version != cursor.get('version'):
+                raise OutdatedCursor
         else:
-            page = int(request.GET.get('page', 1))
-            start = (page - 1) * self.paginate_by
-            end = page * self.paginate_by
-            count = queryset.count()
-            queryset = queryset[start:end]
-            more = count > end
+            index = None
+        if term:
+            values, more, cursor = self.get_term_page(queryset, field, term, cursor, index)
+        else:
+            values, more, cursor = self.get_page(queryset, field, cursor, page, index)
 
         result = dict(
-            results=[dict(id=v, text=v) for v in queryset],
-            pagination=dict(more=more),
+            results=[dict(id=v, text=v) for v in values],
+            pagination=dict(more=more, cursor=cursor),
         )
+        if cache:
+            cache.set(key, result, get_cache_timeout())
         return Response(result)
+
+    def get_page(self, queryset, field, cursor=None, page=1, index=None):
+        """
+        Return the values of a page, if there are more pages and the cursor of
+        the next page. We use keyset pagination with the last value of a page
+        as cursor. So each page costs the same and we need no count query.
+        """
+        after = None if cursor is None else cursor['value']
+
+        # Without a cursor we fall back to offset pagination. Select2 passes
+        # the cursor for every page but the first one.
+        offset = max(page - 1, 0) * self.paginate_by if cursor is None else 0
+
+        # Fetch one more value to know if there is a next page.
+        values = self.get_values(queryset, field, None, after=after, limit=self.paginate_by + 1, offset=offset, index=index)
+        more = len(values) > self.paginate_by
+        values = values[:self.paginate_by]
+        cursor = self.encode_cursor(value=values[-1], index=index) if more else None
+        return values, more, cursor
+
+    def get_term_page(self, queryset, field, term, cursor=None, index=None):
+        """
+        Return a page of values matching the term, if there are more pages and
+        the cursor of the next page. Values starting with the term come first
+        since this lookup could use an index. Values only containing the term
+        fill up the rest. A search returns max_results values at most and a
+        page is limited to about max_response_size characters.
+        """
+        cursor = dict(dict(phase='prefix', value=None, count=0), **(cursor or {}))
+        phases = ['prefix', 'contains']
+        # Skip the prefix phase if the cursor points to the contains phase.
+        if cursor['phase'] == 'contains':
+            phases = phases[1:]
+
+        # Fetch one more value to know if there is a next page.
+        limit = max(min(self.paginate_by, self.max_results - cursor['count']), 0)
+        values = []
+        for phase in phases:
+            after = cursor['value'] if phase == cursor['phase'] else None
+            phase_values = self.get_values(queryset, field, phase, term, after, limit + 1 - len(values), index=index)
+            values += [(phase, v) for v in phase_values]
+            if len(values) > limit:
+                break
+        more = len(values) > limit
+        values = values[:limit]
+
+        # Cut the page if it exceeds the response size.
+        size = 0
+        for i, (phase, value) in enumerate(values):
+            size += len(str(value))
+            if i and size > self.max_response_size:
+                values, more = values[:i], True
+                break
+
+        # Stop if we reached the max number of results.
+        count = cursor['count'] + len(values)
+        more = more and count < self.max_results
+
+        if more:
+            cursor = self.encode_cursor(phase=values[-1][0], value=values[-1][1], count=count, index=index)
+        else:
+            cursor = None
+        return [v for p, v in values], more, cursor
+
+    def get_values(self, queryset, field, phase, term=None, after=None, limit=None, offset=0, index=None):
+        """
+        Return the values of a phase that are greater than after. Phases are
+        'prefix' for values starting with the term, 'contains' for values only
+        containing it and None for all values. The values are taken from the
+        index if there is one.
+        """
+        if index is not None:
+            return index.get_values(phase, term, after, limit, offset)
+
+        attname = field.attname
+        if phase == 'prefix':
+            queryset = queryset.filter(**{f'{attname}__istartswith': term})
+        elif phase == 'contains':
+            queryset = queryset.filter(**{f'{attname}__icontains': term})
+            queryset = queryset.exclude(**{f'{attname}__istartswith': term})
+        if after is not None:
+            queryset = queryset.filter(**{f'{attname}__gt': after})
+        stop = None if limit is None else offset + limit
+        return list(queryset[offset:stop])
+
+    def encode_cursor(self, index=None, **cursor):
+        cursor['value'] = str(cursor['value'])
+        if index is None:
+            cursor['source'] = 'database'
+        else:
+            cursor.update(source='index', version=index.version)
+        return urlsafe_base64_encode(json.dumps(cursor).encode('utf-8'))
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None
+        try:
+            cursor = json.loads(urlsafe_base64_decode(cursor))
+        except ValueError as e:
+            raise ParseError(_('Invalid cursor.')) from e
+        if not (
+            isinstance(cursor, dict)
+            and isinstance(cursor.get('value'), str)
+            and cursor.get('phase', 'prefix') in ('prefix', 'contains')
+            and isinstance(cursor.get('count', 0), int)
+        ):
+            raise ParseError(_('Invalid cursor.'))
+        return cursor
@@ -32,4 +32,26 @@ class Select2(Select2Mixin, forms.Select):
 
 
 class MultiSelect2(Select2Mixin, forms.SelectMultiple):
-    pass
\ No newline at end of file
+    pass
+
+
+class FieldLookupSelect(forms.Select):
+    """
+    Render only the selected field lookup. The options of all field lookups
+    are rendered once per formset and added to the select on the client.
+    """
+    def __init__(self, field_plan, attrs=None):
+        self.field_plan = field_plan
+        super().__init__(attrs)
+
+    def optgroups(self, name, value, attrs=None):
+        value = [v for v in value if v]
+        # Without a value the form selects the first choice.
+        if not value:
+            value = [c[0] for group in self.field_plan.get_field_lookup_choices() for c in group[1]][:1]
+        options = []
+        for i, v in enumerate(value):
+            if self.field_plan.is_valid_field_lookup(v):
+                label = self.field_plan.get_field_lookup_label(v)
+                options.append(self.create_option(name, v, label, True, i, attrs=attrs))
+        return [(None, options, 0)]